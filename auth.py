@@ -0,0 +1,69 @@
+# auth.py
+# 로그인 처리: bcrypt 비밀번호 검증(세션당 1회)과 서명된 세션 토큰 발급/확인
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+import bcrypt
+
+# 세션 토큰 유효 시간 (초)
+TOKEN_TTL_SECONDS = 12 * 60 * 60
+
+# 동시에 실행되는 bcrypt 검증 수 제한. 출근 시간에 로그인이 몰려도 서버 CPU를 모두 점유하지 않도록 함
+MAX_CONCURRENT_HASHES = max(1, (os.cpu_count() or 2) // 2)
+_hash_slots = threading.BoundedSemaphore(MAX_CONCURRENT_HASHES)
+
+
+class LoginBusy(Exception):
+    """대기 시간 안에 비밀번호 검증 슬롯을 얻지 못함"""
+
+
+def check_password(password, hashed_password, wait_seconds=10):
+    if not _hash_slots.acquire(timeout=wait_seconds):
+        raise LoginBusy()
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except ValueError:
+        # 시트에 잘못된 형식의 해시가 들어있는 경우
+        return False
+    finally:
+        _hash_slots.release()
+
+
+def password_fingerprint(hashed_password):
+    # 비밀번호가 바뀌면 기존 토큰이 무효가 되도록 토큰에 해시의 지문을 포함
+    return hashlib.sha256(hashed_password.encode('utf-8')).hexdigest()[:16]
+
+
+def _sign(payload, secret_key):
+    return hmac.new(secret_key, payload, hashlib.sha256).hexdigest()
+
+
+def issue_token(username, hashed_password, secret_key, ttl=TOKEN_TTL_SECONDS, now=None):
+    expires = int((now or time.time()) + ttl)
+    payload = f"{username}|{expires}|{password_fingerprint(hashed_password)}".encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii') + "." + _sign(payload, secret_key)
+
+
+def verify_token(token, users, secret_key, now=None):
+    """유효한 토큰이면 사용자 아이디, 아니면 None. bcrypt 없이 HMAC 비교만 수행"""
+    if not token or "." not in token:
+        return None
+    encoded, signature = token.rsplit(".", 1)
+    try:
+        payload = base64.urlsafe_b64decode(encoded.encode('ascii'))
+        username, expires, fingerprint = payload.decode('utf-8').rsplit("|", 2)
+        expires = int(expires)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _sign(payload, secret_key)):
+        return None
+    if expires < (now or time.time()):
+        return None
+    hashed_password = users.get(username)
+    if hashed_password is None or fingerprint != password_fingerprint(hashed_password):
+        return None
+    return username
@@ -0,0 +1,87 @@
+# bench_quote_api.py
+# 가격 조회 API의 동시 부하 지연 시간(p50/p99) 측정. 로컬 CSV로 서버를 띄운 뒤 여러 스레드에서 요청
+# 사용법: python bench_quote_api.py products.csv clients.csv prices.csv [--clients-n 16] [--requests 20000]
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from price_data import PRODUCT_KEY, load_csv_tables
+from quote_api import QuoteService, make_server
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def run_client(port, paths, batch_body=None):
+    # 연결을 재사용하는 클라이언트 하나 (keep-alive)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    for path in paths:
+        started = time.perf_counter()
+        if batch_body is None:
+            conn.request("GET", path)
+        else:
+            conn.request("POST", "/quotes", body=batch_body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    return latencies
+
+
+def report(label, latencies, elapsed):
+    latencies.sort()
+    print(f"{label:<12} n={len(latencies):,}  {len(latencies) / elapsed:,.0f} req/s  "
+          f"p50={statistics.median(latencies) * 1000:.2f}ms  p99={percentile(latencies, 99) * 1000:.2f}ms  "
+          f"max={latencies[-1] * 1000:.2f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="가격 조회 API 부하 측정")
+    parser.add_argument("products")
+    parser.add_argument("clients")
+    parser.add_argument("prices")
+    parser.add_argument("--clients-n", type=int, default=16, help="동시 클라이언트 수")
+    parser.add_argument("--requests", type=int, default=20000, help="단건 조회 총 요청 수")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    tables = load_csv_tables(args.products, args.clients, args.prices)
+    service = QuoteService(lambda: tables, refresh_seconds=3600)
+    server = make_server(service, port=0)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    prices_df = tables[2]
+    pairs = list(zip(prices_df['customer_name'], prices_df[PRODUCT_KEY]))
+    rng = random.Random(0)
+    per_client = args.requests // args.clients_n
+    client_paths = [
+        [f"/quote?{urlencode({'customer': c, 'product': p})}" for c, p in (rng.choice(pairs) for _ in range(per_client))]
+        for _ in range(args.clients_n)
+    ]
+    batch_body = json.dumps({"items": [{"customer": c, "product": p} for c, p in rng.sample(pairs, min(args.batch_size, len(pairs)))]})
+
+    with ThreadPoolExecutor(args.clients_n) as pool:
+        started = time.perf_counter()
+        single = [lat for result in pool.map(lambda paths: run_client(port, paths), client_paths) for lat in result]
+        report("single", single, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        batch_paths = [[None] * max(1, per_client // 10)] * args.clients_n
+        batch = [lat for result in pool.map(lambda paths: run_client(port, paths, batch_body), batch_paths) for lat in result]
+        report(f"batch x{args.batch_size}", batch, time.perf_counter() - started)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
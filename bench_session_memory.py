@@ -0,0 +1,90 @@
+# bench_session_memory.py
+# 세션 수에 따른 메모리 증가량 비교: 세션별 DataFrame 사본(기존) vs 공유 Arrow 테이블 뷰(현재)
+# 사용법: python bench_session_memory.py [세션 수] [거래처 수] [거래처당 품목 수]
+import pickle
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from price_data import build_shared_tables, table_view, customer_slice
+
+
+def make_frames(n_customers, n_items_per_customer, n_products=2000):
+    rng = np.random.default_rng(0)
+    products_df = pd.DataFrame({
+        'sku_code': [f"GRM-{i:05d}" for i in range(n_products)],
+        'unique_name': [f"제품 {i} ({(i % 5 + 1) * 200}g)" for i in range(n_products)],
+        'stand_cost': rng.integers(1000, 20000, n_products).astype(float),
+        'stand_price_ea': rng.integers(1500, 30000, n_products).astype(float),
+        'box_ea': rng.integers(1, 40, n_products).astype(float),
+    })
+    clients_df = pd.DataFrame({
+        'customer_name': [f"거래처 {i}" for i in range(n_customers)],
+        'channel_type': rng.choice(['마트', '쿠팡 로켓프레시', '일반 도매', '프랜차이즈 본사'], n_customers),
+        'vendor_fee': rng.uniform(0, 15, n_customers),
+    })
+    rows = n_customers * n_items_per_customer
+    prices_df = pd.DataFrame({
+        'confirm_date': ['2025-01-01 10:00'] * rows,
+        'unique_name': products_df['unique_name'].to_numpy()[rng.integers(0, n_products, rows)],
+        'customer_name': np.repeat(clients_df['customer_name'].to_numpy(), n_items_per_customer),
+        'stand_cost': rng.integers(1000, 20000, rows).astype(float),
+        'supply_price': rng.integers(1500, 30000, rows).astype(float),
+        'margin_rate': rng.uniform(-10, 40, rows),
+        'profit_per_ea': rng.uniform(-1000, 5000, rows),
+        'profit_per_box': rng.uniform(-10000, 50000, rows),
+    })
+    return products_df, clients_df, prices_df
+
+
+def used_bytes():
+    # numpy/파이썬 객체는 tracemalloc, Arrow 버퍼는 Arrow 메모리 풀에서 집계
+    return tracemalloc.get_traced_memory()[0] + pa.total_allocated_bytes()
+
+
+def legacy_session(cached_blob, customer_name):
+    # st.cache_data는 캐시 적중마다 저장된 값을 역직렬화하여 세션별 사본을 만든다
+    products_df, clients_df, prices_df = pickle.loads(cached_blob)
+    active_prices_df = prices_df[prices_df['customer_name'] == customer_name].copy()
+    return products_df, clients_df, prices_df, active_prices_df
+
+
+def shared_session(shared, customer_name):
+    tables = shared["tables"]
+    views = [table_view(tables[name]) for name in ("products", "clients", "prices")]
+    return views + [customer_slice(tables["prices"], customer_name)]
+
+
+def measure(label, n_sessions, open_session):
+    sessions = []
+    base = used_bytes()
+    for i in range(n_sessions):
+        sessions.append(open_session(i))
+    per_session = (used_bytes() - base) / n_sessions
+    print(f"{label:<28} {per_session / 1024 / 1024:10.2f} MB/session")
+    return per_session
+
+
+def main(n_sessions=20, n_customers=300, n_items_per_customer=200):
+    frames = make_frames(n_customers, n_items_per_customer)
+    customers = frames[1]['customer_name'].tolist()
+    print(f"prices rows: {len(frames[2]):,} / sessions: {n_sessions}")
+
+    tracemalloc.start()
+    cached_blob = pickle.dumps(frames)
+    legacy = measure("legacy (per-session copies)", n_sessions,
+                     lambda i: legacy_session(cached_blob, customers[i % len(customers)]))
+    del cached_blob
+
+    shared = build_shared_tables(frames)
+    current = measure("shared (Arrow views)", n_sessions,
+                      lambda i: shared_session(shared, customers[i % len(customers)]))
+    tracemalloc.stop()
+    print(f"reduction: {legacy / max(current, 1):,.1f}x")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,20 +1,119 @@
 # create_user.py
-import bcrypt
+# 사용법:
+#   python create_user.py                       # 한 명씩 입력받아 해시 출력
+#   python create_user.py --batch users.csv     # CSV(username,password)의 사용자를 일괄 생성하여 사용자 DB에 저장
+import argparse
 import getpass
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+import pandas as pd
+
+from price_data import USER_DB_NAME, SECRETS_PATH, open_worksheet
+
+DEFAULT_ROUNDS = 12
+# bcrypt가 허용하는 cost factor 범위
+MIN_ROUNDS, MAX_ROUNDS = 4, 31
+
+
+def hash_password(password, rounds=DEFAULT_ROUNDS):
+    # 비밀번호를 바이트로 인코딩하고, salt를 생성하여 해싱합니다.
+    salt = bcrypt.gensalt(rounds=rounds)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def create_single_user(rounds=DEFAULT_ROUNDS):
+    # 사용자로부터 아이디와 비밀번호를 입력받습니다.
+    username = input("생성할 사용자 아이디를 입력하세요: ")
+    password = getpass.getpass("사용할 비밀번호를 입력하세요 (화면에 보이지 않습니다): ")
+    if not password.strip():
+        print("비밀번호가 비어 있어 사용자를 만들지 않았습니다.")
+        return
+
+    hashed_password = hash_password(password, rounds)
+
+    # 해시된 비밀번호를 화면에 출력합니다 (이 값을 구글 시트에 복사).
+    print("\n--- 사용자 정보 생성 완료 ---")
+    print(f"사용자 아이디: {username}")
+    print(f"해시된 비밀번호 (이 값을 복사하세요): {hashed_password}")
+    print("\n위 '해시된 비밀번호' 값을 복사하여 Goremi Users DB 시트의 'hashed_password' 열에 붙여넣으세요.")
+
+
+def hash_users(users_df, rounds=DEFAULT_ROUNDS, workers=None):
+    """bcrypt는 의도적으로 CPU를 많이 쓰므로 프로세스 풀에서 병렬로 해싱"""
+    passwords = users_df['password'].astype(str).tolist()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        hashed = list(pool.map(hash_password, passwords, [rounds] * len(passwords), chunksize=4))
+    result = users_df.drop(columns=['password']).copy()
+    result['hashed_password'] = hashed
+    return result
+
+
+def merge_users(existing_df, new_users_df):
+    # 같은 아이디는 새 해시로 교체(비밀번호 초기화), 나머지는 뒤에 추가.
+    # 기존 시트의 다른 열은 CSV에 값이 있을 때만 덮어씀 (빈 칸은 기존 값 유지)
+    if existing_df.empty:
+        return new_users_df.reset_index(drop=True)
+    existing_df = existing_df.copy()
+    existing_df['username'] = existing_df['username'].astype(str).str.strip()
+    existing = existing_df.drop_duplicates('username', keep='last').set_index('username')
+    updates = new_users_df.set_index('username')
+    updates = updates.where(updates.astype(str).apply(lambda col: col.str.strip()) != '')
+    row_order = list(existing.index) + [name for name in updates.index if name not in existing.index]
+    column_order = list(dict.fromkeys(list(existing.columns) + list(updates.columns)))
+    merged = updates.combine_first(existing).reindex(index=row_order, columns=column_order)
+    return merged.fillna('').reset_index()
+
+
+def create_batch_users(csv_path, rounds=DEFAULT_ROUNDS, workers=None, output=None, credentials_path=SECRETS_PATH):
+    users_df = pd.read_csv(csv_path, dtype=str).fillna('')
+    users_df['username'] = users_df['username'].str.strip()
+    users_df = users_df[users_df['username'] != ''].drop_duplicates('username', keep='last')
+    # 빈 비밀번호로는 계정을 만들지 않음 (빈 비밀번호로 로그인되는 계정 방지)
+    blank_password = users_df['password'].str.strip() == ''
+    if blank_password.any():
+        print(f"비밀번호가 비어 있는 {blank_password.sum()}명은 건너뜁니다: {', '.join(users_df.loc[blank_password, 'username'])}")
+        users_df = users_df[~blank_password]
+    if users_df.empty:
+        print("생성할 사용자가 없습니다.")
+        return
+
+    print(f"{len(users_df)}명의 비밀번호를 해싱합니다 (cost={rounds})...")
+    new_users_df = hash_users(users_df, rounds=rounds, workers=workers)
+
+    if output:
+        new_users_df.to_csv(output, index=False)
+        print(f"결과를 '{output}'에 저장했습니다.")
+        return
+
+    from gspread_dataframe import set_with_dataframe
+
+    users_sheet = open_worksheet(USER_DB_NAME, "users", credentials_path)
+    existing_df = pd.DataFrame(users_sheet.get_all_records())
+    final_df = merge_users(existing_df, new_users_df)
+    # 한 번의 일괄 쓰기로 사용자 DB 갱신
+    set_with_dataframe(users_sheet, final_df, allow_formulas=False)
+    print(f"{USER_DB_NAME}에 {len(new_users_df)}명을 반영했습니다. (전체 {len(final_df)}명)")
+
 
-# 사용자로부터 아이디와 비밀번호를 입력받습니다.
-username = input("생성할 사용자 아이디를 입력하세요: ")
-password = getpass.getpass("사용할 비밀번호를 입력하세요 (화면에 보이지 않습니다): ")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="고래미 가격 시스템 사용자 생성")
+    parser.add_argument("--batch", metavar="CSV", help="username,password 열을 가진 사용자 CSV")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help=f"bcrypt cost factor (기본 {DEFAULT_ROUNDS})")
+    parser.add_argument("--workers", type=int, default=None, help="해싱 프로세스 수 (기본: CPU 수)")
+    parser.add_argument("--output", metavar="CSV", help="시트 대신 결과를 CSV로 저장")
+    parser.add_argument("--credentials", default=SECRETS_PATH, help="gcp_service_account가 들어있는 secrets.toml 경로")
+    args = parser.parse_args(argv)
+    if not MIN_ROUNDS <= args.rounds <= MAX_ROUNDS:
+        parser.error(f"--rounds는 {MIN_ROUNDS}~{MAX_ROUNDS} 사이여야 합니다.")
 
-# 비밀번호를 바이트로 인코딩합니다.
-password_bytes = password.encode('utf-8')
+    if args.batch:
+        create_batch_users(args.batch, rounds=args.rounds, workers=args.workers,
+                           output=args.output, credentials_path=args.credentials)
+    else:
+        create_single_user(args.rounds)
 
-# salt를 생성하고 비밀번호를 해싱합니다.
-salt = bcrypt.gensalt()
-hashed_password = bcrypt.hashpw(password_bytes, salt)
 
-# 해시된 비밀번호를 화면에 출력합니다 (이 값을 구글 시트에 복사).
-print("\n--- 사용자 정보 생성 완료 ---")
-print(f"사용자 아이디: {username}")
-print(f"해시된 비밀번호 (이 값을 복사하세요): {hashed_password.decode('utf-8')}")
-print("\n위 '해시된 비밀번호' 값을 복사하여 Goremi Users DB 시트의 'hashed_password' 열에 붙여넣으세요.")
+if __name__ == "__main__":
+    sys.exit(main())
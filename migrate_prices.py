@@ -0,0 +1,200 @@
+# migrate_prices.py
+# 구 스키마(product_name, cost_price, standard_price, total_fee_rate)의 확정 가격 데이터를
+# 현재 스키마(sku_code + unique_name)로 변환하는 도구. 청크 단위로 읽고 써서 이력이 길어도 메모리 사용량이 일정함
+#
+# 사용법:
+#   python migrate_prices.py confirmed_prices.csv --products products_master.csv --out migrated.csv
+#   python migrate_prices.py confirmed_prices.csv --aliases products.csv --to-sheet
+#
+# 매칭되지 않은 행은 원본 그대로 --unmatched 파일에 사유와 함께 기록되므로 데이터가 사라지지 않음
+# --to-sheet는 새 워크시트에 모두 쓴 뒤에만 기존 시트와 교체하며, 기존 시트는 백업 워크시트로 남김
+import argparse
+import re
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from price_data import (
+    PRODUCT_DB_NAME, PRICE_DB_NAME, PRODUCT_KEY, SECRETS_PATH, open_spreadsheet, open_worksheet, prep_products
+)
+
+LEGACY_COLUMNS = ['confirm_date', 'product_name', 'customer_name', 'cost_price', 'standard_price',
+                  'supply_price', 'margin_rate', 'total_fee_rate']
+# 현재 스키마에 없는 구 컬럼도 버리지 않고 함께 옮김
+CARRIED_COLUMNS = {'product_name': 'legacy_product_name', 'standard_price': 'standard_price',
+                   'total_fee_rate': 'total_fee_rate'}
+DEFAULT_CHUNK_SIZE = 50_000
+PRICE_SHEET = "confirmed_prices"
+STAGING_SHEET = "confirmed_prices_migrating"
+
+_NAME_NOISE = re.compile(r"[\s()\[\]]+")
+
+
+def normalize_names(names):
+    # '가니미소 1kg', '가니미소 (1kg)', '가니미소(1KG)'를 같은 키로 맞춤
+    return names.astype(str).str.replace(_NAME_NOISE, "", regex=True).str.lower()
+
+
+def build_lookup_index(products_df, aliases_df=None):
+    """정규화된 제품명 -> sku_code. 여러 제품에 걸리는 이름은 잘못 매칭되지 않도록 모호한 키로 분리"""
+    keys = products_df[PRODUCT_KEY].astype(str).str.strip()
+    candidates = [
+        pd.DataFrame({'name': normalize_names(products_df['unique_name']), PRODUCT_KEY: keys}),
+        pd.DataFrame({'name': normalize_names(keys), PRODUCT_KEY: keys}),
+    ]
+    if aliases_df is not None and not aliases_df.empty:
+        candidates.append(pd.DataFrame({
+            'name': normalize_names(aliases_df['product_name']),
+            PRODUCT_KEY: aliases_df[PRODUCT_KEY].astype(str).str.strip(),
+        }))
+    names = pd.concat(candidates, ignore_index=True).drop_duplicates()
+    sku_count = names.groupby('name')[PRODUCT_KEY].transform('nunique')
+    index = names[sku_count == 1].set_index('name')[PRODUCT_KEY]
+    ambiguous = set(names.loc[sku_count > 1, 'name'])
+    return index, ambiguous
+
+
+def migrate_chunk(chunk, index, ambiguous, products_by_key):
+    """한 청크를 변환. (변환된 행, 매칭 실패 행) 반환"""
+    normalized = normalize_names(chunk['product_name'])
+    sku_codes = normalized.map(index)
+    matched = sku_codes.notna()
+
+    unmatched = chunk[~matched].copy()
+    unmatched['reason'] = normalized[~matched].isin(ambiguous).map({True: 'ambiguous', False: 'no_match'})
+
+    rows = chunk[matched]
+    product_info = products_by_key.reindex(sku_codes[matched])
+    numeric = {col: pd.to_numeric(rows[col].astype(str).str.replace(',', '', regex=False), errors='coerce')
+               for col in ['cost_price', 'supply_price', 'margin_rate', 'total_fee_rate', 'standard_price']}
+    net_settlement = numeric['supply_price'] * (1 - numeric['total_fee_rate'].fillna(0) / 100)
+    profit_per_ea = net_settlement - numeric['cost_price']
+
+    migrated = pd.DataFrame({
+        'confirm_date': rows['confirm_date'],
+        PRODUCT_KEY: sku_codes[matched],
+        'unique_name': product_info['unique_name'].to_numpy(),
+        'customer_name': rows['customer_name'],
+        'stand_cost': numeric['cost_price'],
+        'supply_price': numeric['supply_price'],
+        'margin_rate': numeric['margin_rate'],
+        'profit_per_ea': profit_per_ea,
+        'profit_per_box': profit_per_ea * product_info['box_ea'].to_numpy(),
+    })
+    for legacy_col, new_col in CARRIED_COLUMNS.items():
+        migrated[new_col] = numeric.get(legacy_col, rows[legacy_col])
+    return migrated, unmatched
+
+
+def check_source_columns(csv_path):
+    # 시트를 건드리기 전에 헤더만 읽어 구 스키마인지 확인
+    columns = pd.read_csv(csv_path, dtype=str, nrows=0).columns
+    missing = [col for col in LEGACY_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(f"구 스키마 컬럼이 없습니다: {missing}")
+
+
+def iter_migrated_chunks(csv_path, index, ambiguous, products_by_key, chunk_size=DEFAULT_CHUNK_SIZE):
+    check_source_columns(csv_path)
+    for chunk in pd.read_csv(csv_path, dtype=str, keep_default_na=False, chunksize=chunk_size):
+        yield migrate_chunk(chunk, index, ambiguous, products_by_key)
+
+
+def open_staging_sheet(spreadsheet):
+    # 이전 실행이 실패하여 남은 임시 워크시트는 지우고 새로 만듦
+    for worksheet in spreadsheet.worksheets():
+        if worksheet.title == STAGING_SHEET:
+            spreadsheet.del_worksheet(worksheet)
+    return spreadsheet.add_worksheet(title=STAGING_SHEET, rows=1, cols=1)
+
+
+def swap_price_sheet(spreadsheet, staging_sheet):
+    """모든 청크를 쓴 뒤에만 호출. 기존 시트는 이름을 바꿔 백업으로 남기고 임시 시트를 confirmed_prices로 교체"""
+    backup_title = f"{PRICE_SHEET}_legacy_{datetime.now():%Y%m%d_%H%M%S}"
+    spreadsheet.worksheet(PRICE_SHEET).update_title(backup_title)
+    staging_sheet.update_title(PRICE_SHEET)
+    return backup_title
+
+
+def load_products(products_path=None, secrets_path=SECRETS_PATH):
+    if products_path:
+        products_df = pd.read_csv(products_path, dtype=str, keep_default_na=False)
+    else:
+        products_df = pd.DataFrame(open_worksheet(PRODUCT_DB_NAME, "products", secrets_path).get_all_records())
+    return prep_products(products_df)
+
+
+def migrate(csv_path, out_path=None, unmatched_path="unmatched_prices.csv", products_path=None,
+            aliases_path=None, to_sheet=False, chunk_size=DEFAULT_CHUNK_SIZE, secrets_path=SECRETS_PATH):
+    check_source_columns(csv_path)
+    products_df = load_products(products_path, secrets_path)
+    aliases_df = pd.read_csv(aliases_path, dtype=str, keep_default_na=False) if aliases_path else None
+    index, ambiguous = build_lookup_index(products_df, aliases_df)
+    products_by_key = products_df.drop_duplicates(PRODUCT_KEY).set_index(PRODUCT_KEY)
+
+    spreadsheet = staging_sheet = None
+    if to_sheet:
+        # 기존 confirmed_prices는 교체 직전까지 건드리지 않음
+        spreadsheet = open_spreadsheet(PRICE_DB_NAME, secrets_path)
+        staging_sheet = open_staging_sheet(spreadsheet)
+
+    total = migrated_total = unmatched_total = 0
+    try:
+        for i, (migrated, unmatched) in enumerate(iter_migrated_chunks(csv_path, index, ambiguous, products_by_key, chunk_size)):
+            first = i == 0
+            if out_path:
+                migrated.to_csv(out_path, mode='w' if first else 'a', header=first, index=False)
+            if staging_sheet is not None:
+                values = migrated.astype(object).where(migrated.notna(), '').values.tolist()
+                staging_sheet.append_rows(([list(migrated.columns)] if first else []) + values, value_input_option='RAW')
+            unmatched.to_csv(unmatched_path, mode='w' if first else 'a', header=first, index=False)
+
+            total += len(migrated) + len(unmatched)
+            migrated_total += len(migrated)
+            unmatched_total += len(unmatched)
+            print(f"  {total:,}행 처리 (변환 {migrated_total:,} / 미매칭 {unmatched_total:,})")
+    except Exception:
+        if staging_sheet is not None:
+            spreadsheet.del_worksheet(staging_sheet)
+            print(f"오류로 중단되어 임시 워크시트를 삭제했습니다. '{PRICE_SHEET}' 시트는 변경되지 않았습니다.")
+        raise
+
+    backup_title = swap_price_sheet(spreadsheet, staging_sheet) if staging_sheet is not None else None
+
+    print("\n--- 마이그레이션 완료 ---")
+    print(f"전체 {total:,}행 중 {migrated_total:,}행 변환, {unmatched_total:,}행 미매칭")
+    if backup_title:
+        print(f"'{PRICE_SHEET}' 시트를 교체했습니다. 기존 데이터는 '{backup_title}' 워크시트에 그대로 남아 있습니다.")
+    if unmatched_total:
+        if backup_title:
+            print(f"⚠️ 미매칭 {unmatched_total:,}행은 새 '{PRICE_SHEET}' 시트에 없습니다. "
+                  f"원본은 '{backup_title}' 워크시트와 '{unmatched_path}'에 있습니다.")
+        else:
+            print(f"미매칭 행은 '{unmatched_path}'에 원본 그대로 저장되었습니다.")
+        print("제품명을 확인한 뒤 다시 실행하세요.")
+    return {'total': total, 'migrated': migrated_total, 'unmatched': unmatched_total, 'backup_sheet': backup_title}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="구 스키마 확정 가격 데이터 마이그레이션")
+    parser.add_argument("source", help="구 스키마 confirmed_prices CSV")
+    parser.add_argument("--out", help="변환 결과 CSV")
+    parser.add_argument("--unmatched", default="unmatched_prices.csv", help="미매칭 행 보고서 CSV")
+    parser.add_argument("--products", help="제품 마스터 CSV (없으면 Goremi Products DB 시트에서 읽음)")
+    parser.add_argument("--aliases", help="구 제품명 -> sku_code 대응 CSV (sku_code, product_name 열; 예: products.csv)")
+    parser.add_argument("--to-sheet", action="store_true",
+                        help="결과로 Goremi Price DB의 confirmed_prices 시트를 교체 (기존 시트는 백업 워크시트로 보관)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--credentials", default=SECRETS_PATH, help="gcp_service_account가 들어있는 secrets.toml 경로")
+    args = parser.parse_args(argv)
+
+    if not args.out and not args.to_sheet:
+        parser.error("--out 또는 --to-sheet 중 하나는 지정해야 합니다.")
+    migrate(args.source, out_path=args.out, unmatched_path=args.unmatched, products_path=args.products,
+            aliases_path=args.aliases, to_sheet=args.to_sheet, chunk_size=args.chunk_size,
+            secrets_path=args.credentials)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# order_volume.py
+# 주문/출고 로그(JSON Lines 또는 CSV)를 한 줄씩 스트리밍으로 읽어 (거래처, 품목)별 수량을 누적하고
+# 확정 가격의 개당 이익과 결합하여 기간 내 총 이익을 계산. 메모리는 줄 수가 아니라 (거래처, 품목) 조합 수에만 비례
+#
+# 사용법:
+#   python order_volume.py orders.jsonl --from 2025-01-01 --to 2025-01-31 --out profit.csv
+#   python order_volume.py orders.csv --products products.csv --clients clients.csv --prices prices.csv
+#
+# 각 레코드에는 customer_name, quantity와 sku_code 또는 unique_name이 있어야 하며,
+# 날짜(order_date / date / confirm_date 중 하나)가 있으면 기간 필터에 사용됨
+import argparse
+import csv
+import io
+import json
+import math
+import sys
+from collections import defaultdict
+from datetime import date
+
+import pandas as pd
+
+from price_data import PRODUCT_KEY, SECRETS_PATH, load_csv_tables, load_sheet_tables, quote_table
+
+DATE_FIELDS = ('order_date', 'date', 'confirm_date')
+
+
+def read_records(lines, fmt):
+    """텍스트 줄 이터러블 -> dict 레코드 제너레이터"""
+    if fmt == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+
+
+def detect_format(path):
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def parse_date(value):
+    """'2025-01-10', '2025/01/10', '2025.01.10', '2025-01-10 09:30' -> date. 해석할 수 없으면 None"""
+    text = str(value).strip()[:10].replace('/', '-').replace('.', '-')
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def parse_orders(records, stats, date_from=None, date_to=None):
+    """레코드 정규화 및 기간 필터. (customer_name, 제품 참조, 수량) 제너레이터.
+    제품 참조는 ('sku', 값) 또는 ('name', 값). 잘못된 줄은 건너뛰고 stats에 집계"""
+    date_from = date.fromisoformat(date_from) if date_from else None
+    date_to = date.fromisoformat(date_to) if date_to else None
+    for record in records:
+        stats['lines'] += 1
+        if not isinstance(record, dict):
+            stats['invalid'] += 1
+            continue
+        raw_date = next((record[field] for field in DATE_FIELDS if record.get(field)), None)
+        order_date = parse_date(raw_date) if raw_date else None
+        if raw_date and order_date is None:
+            stats['invalid'] += 1
+            continue
+        if order_date and ((date_from and order_date < date_from) or (date_to and order_date > date_to)):
+            stats['out_of_period'] += 1
+            continue
+        customer_name = str(record.get('customer_name') or '').strip()
+        sku_code = str(record.get(PRODUCT_KEY) or '').strip()
+        unique_name = str(record.get('unique_name') or '').strip()
+        try:
+            quantity = float(str(record.get('quantity', '')).replace(',', ''))
+        except ValueError:
+            quantity = None
+        if quantity is not None and not math.isfinite(quantity):
+            quantity = None  # 'nan', 'inf'는 합계를 망가뜨리므로 잘못된 줄로 처리
+        if not customer_name or not (sku_code or unique_name) or quantity is None:
+            stats['invalid'] += 1
+            continue
+        yield customer_name, ('sku', sku_code) if sku_code else ('name', unique_name), quantity
+
+
+def aggregate_quantities(orders):
+    """(customer_name, 제품 참조)별 수량 누적"""
+    totals = defaultdict(float)
+    for customer_name, product_ref, quantity in orders:
+        totals[(customer_name, product_ref)] += quantity
+    return totals
+
+
+def quantities_frame(totals, products_df):
+    # unique_name으로 들어온 주문은 제품 마스터에서 sku_code로 변환한 뒤 합산
+    rows = pd.DataFrame(
+        [(customer, kind, ref, qty) for (customer, (kind, ref)), qty in totals.items()],
+        columns=['customer_name', 'ref_kind', 'ref', 'quantity'],
+    )
+    name_to_key = products_df.drop_duplicates('unique_name').set_index('unique_name')[PRODUCT_KEY]
+    rows[PRODUCT_KEY] = rows['ref'].where(rows['ref_kind'] == 'sku', rows['ref'].map(name_to_key))
+    unresolved = rows[rows[PRODUCT_KEY].isna()]
+    resolved = rows.dropna(subset=[PRODUCT_KEY]).groupby(['customer_name', PRODUCT_KEY], as_index=False)['quantity'].sum()
+    return resolved, unresolved
+
+
+def volume_weighted_profit(quantities_df, products_df, clients_df, prices_df, apply_trunk_fee=False):
+    """수량과 확정 가격의 개당 이익을 결합. 확정 가격이 없는 (거래처, 품목)은 별도로 반환"""
+    quotes = quote_table(products_df, clients_df, prices_df, apply_trunk_fee=apply_trunk_fee)
+    quotes = quotes.drop_duplicates(['customer_name', PRODUCT_KEY], keep='last')
+    merged = quantities_df.merge(quotes, on=['customer_name', PRODUCT_KEY], how='left', indicator=True)
+    unpriced = merged.loc[merged['_merge'] == 'left_only', ['customer_name', PRODUCT_KEY, 'quantity']]
+    profit = merged[merged['_merge'] == 'both'].drop(columns='_merge')
+    profit['total_sales'] = profit['supply_price'] * profit['quantity']
+    profit['total_net_settlement'] = profit['net_settlement'] * profit['quantity']
+    profit['total_profit'] = profit['profit_per_ea'] * profit['quantity']
+    cols = ['customer_name', PRODUCT_KEY, 'unique_name', 'quantity', 'supply_price', 'net_settlement',
+            'profit_per_ea', 'total_sales', 'total_net_settlement', 'total_profit']
+    return profit[cols].sort_values('total_profit', ascending=False).reset_index(drop=True), unpriced
+
+
+def customer_totals(profit_df):
+    totals = profit_df.groupby('customer_name', as_index=False)[['quantity', 'total_sales', 'total_profit']].sum()
+    totals['profit_rate'] = (totals['total_profit'] / totals['total_sales'] * 100).where(totals['total_sales'] > 0, 0.0)
+    return totals.sort_values('total_profit', ascending=False).reset_index(drop=True)
+
+
+def ingest(lines, fmt, products_df, clients_df, prices_df, date_from=None, date_to=None, apply_trunk_fee=False):
+    """줄 이터러블 하나를 끝까지 스트리밍 처리. (품목별 이익, 거래처별 합계, 미해결/미확정 목록, 통계)"""
+    stats = defaultdict(int)
+    totals = aggregate_quantities(parse_orders(read_records(lines, fmt), stats, date_from, date_to))
+    quantities_df, unresolved = quantities_frame(totals, products_df)
+    profit_df, unpriced = volume_weighted_profit(quantities_df, products_df, clients_df, prices_df, apply_trunk_fee)
+    stats['pairs'] = len(totals)
+    return {
+        'profit': profit_df, 'customers': customer_totals(profit_df),
+        'unresolved': unresolved, 'unpriced': unpriced, 'stats': dict(stats),
+    }
+
+
+def ingest_upload(uploaded_file, products_df, clients_df, prices_df, **kwargs):
+    # Streamlit 업로드 파일도 줄 단위로 읽어 같은 파이프라인을 사용
+    lines = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    return ingest(lines, detect_format(uploaded_file.name), products_df, clients_df, prices_df, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="주문량 기반 거래처/품목별 총 이익 계산")
+    parser.add_argument("orders", help="주문/출고 로그 (.jsonl 또는 .csv)")
+    parser.add_argument("--from", dest="date_from", help="시작일 (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="종료일 (YYYY-MM-DD)")
+    parser.add_argument("--trunk-fee", action="store_true", help="지역 간선비 적용")
+    parser.add_argument("--products", help="제품 마스터 CSV (세 CSV를 모두 주지 않으면 구글 시트에서 읽음)")
+    parser.add_argument("--clients", help="거래처 CSV")
+    parser.add_argument("--prices", help="확정 가격 CSV")
+    parser.add_argument("--credentials", default=SECRETS_PATH, help="gcp_service_account가 들어있는 secrets.toml 경로")
+    parser.add_argument("--out", help="품목별 결과 CSV")
+    args = parser.parse_args(argv)
+
+    if args.products and args.clients and args.prices:
+        products_df, clients_df, prices_df = load_csv_tables(args.products, args.clients, args.prices)
+    else:
+        products_df, clients_df, prices_df = load_sheet_tables(args.credentials)
+
+    with open(args.orders, encoding='utf-8-sig', newline='') as f:
+        result = ingest(f, detect_format(args.orders), products_df, clients_df, prices_df,
+                        date_from=args.date_from, date_to=args.date_to, apply_trunk_fee=args.trunk_fee)
+
+    stats = result['stats']
+    print(f"{stats.get('lines', 0):,}줄 처리 · 기간 외 {stats.get('out_of_period', 0):,} · 오류 {stats.get('invalid', 0):,} "
+          f"· (거래처, 품목) {stats.get('pairs', 0):,}쌍")
+    if not result['unresolved'].empty or not result['unpriced'].empty:
+        print(f"제품 마스터에 없는 품목 {len(result['unresolved']):,}쌍, 확정 가격이 없는 품목 {len(result['unpriced']):,}쌍은 제외되었습니다.")
+    print("\n--- 거래처별 총 이익 ---")
+    print(result['customers'].to_string(index=False))
+    if args.out:
+        result['profit'].to_csv(args.out, index=False)
+        print(f"\n품목별 결과를 '{args.out}'에 저장했습니다.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+# price_data.py
+# 가격 시스템의 공용 데이터 도구 (Streamlit 의존성 없음)
+import os
+import threading
+import tomllib
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# --- (설정) DB 정보 ---
+PRODUCT_DB_NAME = "Goremi Products DB"
+CLIENT_DB_NAME = "Goremi Clients DB"
+PRICE_DB_NAME = "Goremi Price DB"
+USER_DB_NAME = "Goremi Users DB"
+
+# 앱 밖에서 실행하는 도구들이 서비스 계정 정보를 읽는 위치 (Streamlit secrets와 같은 파일)
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+# 공유 테이블 이름 (load 순서와 동일)
+SHARED_TABLE_NAMES = ("products", "clients", "prices")
+
+# 제품 식별 키. unique_name은 화면 표시용 이름으로만 사용
+PRODUCT_KEY = 'sku_code'
+
+# 확정 가격 DB에서 숫자로 다뤄야 하는 컬럼
+PRICE_NUMERIC_COLS = ['stand_cost', 'supply_price', 'margin_rate', 'profit_per_ea', 'profit_per_box']
+
+
+def open_spreadsheet(db_name, secrets_path=SECRETS_PATH):
+    """Streamlit 밖(명령줄 도구)에서 구글 스프레드시트 열기"""
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    with open(secrets_path, "rb") as f:
+        service_account_info = tomllib.load(f)["gcp_service_account"]
+    scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+    creds = Credentials.from_service_account_info(service_account_info, scopes=scopes)
+    return gspread.authorize(creds).open(db_name)
+
+
+def open_worksheet(db_name, worksheet_name, secrets_path=SECRETS_PATH):
+    return open_spreadsheet(db_name, secrets_path).worksheet(worksheet_name)
+
+
+def to_numeric_col(series):
+    # 시트에서 읽은 '1,234' / '5%' 같은 문자열을 숫자로 변환
+    cleaned = series.astype(str).str.replace(',', '', regex=False).str.replace('%', '', regex=False)
+    return pd.to_numeric(cleaned, errors='coerce')
+
+
+def prep_products(products_df):
+    products_df = products_df.copy()
+    products_df['unique_name'] = (
+        products_df['product_name_kr'].astype(str).str.strip() + " (" +
+        products_df['weight'].astype(str).str.strip() +
+        products_df['ea_unit'].astype(str).str.strip() + ")"
+    )
+    for col in ['stand_cost', 'stand_price_ea', 'box_ea']:
+        products_df[col] = pd.to_numeric(
+            products_df[col].astype(str).str.replace(',', '', regex=False), errors='coerce'
+        )
+    products_df = products_df.fillna(0).sort_values(by='unique_name').reset_index(drop=True)
+    return prep_product_keys(products_df)
+
+
+def prep_clients(clients_df):
+    clients_df = clients_df.copy()
+    numeric_client_cols = [col for col in clients_df.columns if col not in ['customer_name', 'channel_type']]
+
+    # '%' 기호를 포함한 데이터 클리닝
+    for col in numeric_client_cols:
+        clients_df[col] = to_numeric_col(clients_df[col])
+    return clients_df.fillna(0)
+
+
+def prep_prices(prices_df):
+    prices_df = prices_df.copy()
+    for col in PRICE_NUMERIC_COLS:
+        if col in prices_df.columns:
+            prices_df[col] = to_numeric_col(prices_df[col])
+    return prices_df
+
+
+def prep_product_keys(products_df):
+    products_df = products_df.copy()
+    products_df[PRODUCT_KEY] = products_df[PRODUCT_KEY].astype(str).str.strip()
+    return products_df
+
+
+def migrate_price_keys(prices_df, products_df):
+    """가격 행에 제품 키(sku_code)를 채우고 unique_name은 제품 마스터의 현재 이름으로 갱신.
+    sku_code가 없는 기존 행은 unique_name으로 제품 마스터에서 키를 찾아 채움"""
+    if prices_df.empty or (PRODUCT_KEY not in prices_df.columns and 'unique_name' not in prices_df.columns):
+        return prices_df
+    prices_df = prices_df.copy()
+    if PRODUCT_KEY in prices_df.columns:
+        keys = prices_df[PRODUCT_KEY].astype(str).str.strip().where(prices_df[PRODUCT_KEY].notna(), '')
+    else:
+        keys = pd.Series('', index=prices_df.index)
+    if 'unique_name' in prices_df.columns:
+        name_to_key = products_df.drop_duplicates('unique_name').set_index('unique_name')[PRODUCT_KEY]
+        keys = keys.mask(keys == '', prices_df['unique_name'].map(name_to_key))
+    prices_df[PRODUCT_KEY] = keys.replace('', None)
+
+    # 제품 마스터에 없는 키는 기존 이름을 그대로 남겨 데이터가 사라지지 않도록 함
+    key_to_name = products_df.drop_duplicates(PRODUCT_KEY).set_index(PRODUCT_KEY)['unique_name']
+    labels = prices_df[PRODUCT_KEY].map(key_to_name)
+    if 'unique_name' in prices_df.columns:
+        labels = labels.fillna(prices_df['unique_name'])
+    prices_df['unique_name'] = labels
+    return prices_df
+
+
+def prep_tables(products_df, clients_df, prices_df):
+    """시트/CSV에서 읽은 원본 세 테이블을 앱에서 쓰는 형태로 정리"""
+    products_df = prep_products(products_df)
+    clients_df = prep_clients(clients_df)
+    prices_df = prep_prices(prices_df)
+    # 기존 unique_name 기반 행에 sku_code를 채움 (다음 저장 시 시트에 반영)
+    prices_df = migrate_price_keys(prices_df, products_df)
+    return products_df, clients_df, prices_df
+
+
+def load_csv_tables(products_path, clients_path, prices_path):
+    # 시트에서 내려받은 CSV로 앱 밖 도구를 실행할 때 사용
+    frames = [pd.read_csv(path, dtype=str, keep_default_na=False) for path in (products_path, clients_path, prices_path)]
+    return prep_tables(*frames)
+
+
+def load_sheet_tables(secrets_path=SECRETS_PATH):
+    frames = [
+        pd.DataFrame(open_worksheet(db_name, worksheet_name, secrets_path).get_all_records())
+        for db_name, worksheet_name in [
+            (PRODUCT_DB_NAME, "products"), (CLIENT_DB_NAME, "confirmed_clients"), (PRICE_DB_NAME, "confirmed_prices"),
+        ]
+    ]
+    return prep_tables(*frames)
+
+
+def to_arrow_table(df):
+    """DataFrame을 불변 Arrow 테이블로 변환. 시트의 숫자/문자 혼합 컬럼은 문자열로 통일"""
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = df[col].astype(str)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def data_version(df):
+    # 내용 기반 버전. 같은 데이터를 다시 불러오면 같은 값이 나오므로 캐시 키로 사용
+    if df.empty:
+        return f"empty-{len(df.columns)}"
+    digest = int(pd.util.hash_pandas_object(df, index=False).sum()) & 0xFFFFFFFFFFFFFFFF
+    return f"{digest:016x}-{len(df)}x{len(df.columns)}"
+
+
+def build_shared_tables(frames):
+    """(products, clients, prices) DataFrame 묶음을 프로세스 공유용 Arrow 테이블과 버전 정보로 변환"""
+    frames = dict(zip(SHARED_TABLE_NAMES, frames))
+    return {
+        "tables": {name: to_arrow_table(df) for name, df in frames.items()},
+        "versions": {name: data_version(df) for name, df in frames.items()},
+    }
+
+
+def table_view(table):
+    # Arrow 버퍼를 그대로 참조하는 DataFrame 뷰 (복사 없음)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def customer_slice(table, customer_name):
+    """한 거래처의 가격 행만 잘라낸 작은 세션 전용 DataFrame"""
+    if table.num_rows == 0 or "customer_name" not in table.column_names:
+        return pd.DataFrame()
+    mask = pc.equal(pc.cast(table["customer_name"], pa.string()), str(customer_name))
+    return table.filter(mask).to_pandas()
+
+
+def shared_nbytes(shared):
+    return sum(table.nbytes for table in shared["tables"].values())
+
+
+def private_nbytes(*frames):
+    """세션이 따로 소유한 메모리 추정치. 공유 Arrow 버퍼를 참조하는 컬럼은 제외"""
+    total = 0
+    for df in frames:
+        if df is None or df.empty:
+            continue
+        for col in df.columns:
+            if not isinstance(df[col].dtype, pd.ArrowDtype):
+                total += int(df[col].memory_usage(index=False, deep=True))
+    return total
+
+
+# --- 수수료 계산 ---
+CLIENT_INFO_COLS = ['customer_name', 'channel_type']
+TRUNK_FEE_COL = '지역 간선비 (%)'
+
+
+def customer_fee_rates(clients_df):
+    """거래처별 기타 수수료율/지역 간선비율 (0~1). index는 customer_name"""
+    fee_cols = [col for col in clients_df.columns if col not in CLIENT_INFO_COLS + [TRUNK_FEE_COL]]
+    rates = pd.DataFrame({
+        'customer_name': clients_df['customer_name'],
+        'other_fee_rate': clients_df[fee_cols].astype(float).sum(axis=1) / 100 if fee_cols else 0.0,
+        'trunk_fee_rate': clients_df[TRUNK_FEE_COL].astype(float) / 100 if TRUNK_FEE_COL in clients_df.columns else 0.0,
+    })
+    return rates.drop_duplicates('customer_name').set_index('customer_name')
+
+
+def quote_table(products_df, clients_df, prices_df, apply_trunk_fee=False):
+    """확정 가격 전체에 가격 시뮬레이션 탭과 같은 수수료 로직을 벡터 연산으로 적용.
+    (customer_name, sku_code)별 실정산액/개당 이익/마진율/박스당 이익"""
+    quotes = prices_df[['customer_name', PRODUCT_KEY, 'supply_price']].merge(
+        products_df[[PRODUCT_KEY, 'unique_name', 'stand_cost', 'stand_price_ea', 'box_ea']], on=PRODUCT_KEY, how='inner'
+    )
+    rates = customer_fee_rates(clients_df)
+    deduction = quotes['customer_name'].map(rates['other_fee_rate'])
+    if apply_trunk_fee:
+        deduction = deduction + quotes['customer_name'].map(rates['trunk_fee_rate'])
+    quotes['supply_price'] = pd.to_numeric(quotes['supply_price'], errors='coerce').fillna(0).astype(float)
+    quotes['deduction_rate'] = deduction.astype(float)
+    quotes['net_settlement'] = quotes['supply_price'] * (1 - quotes['deduction_rate'])
+    quotes['profit_per_ea'] = quotes['net_settlement'] - quotes['stand_cost'].astype(float)
+    quotes['margin_rate'] = (quotes['profit_per_ea'] / quotes['net_settlement'] * 100).where(quotes['net_settlement'] > 0, 0.0)
+    quotes['profit_per_box'] = quotes['profit_per_ea'] * quotes['box_ea'].astype(float)
+    # 거래처 DB에 없는 거래처는 수수료를 알 수 없으므로 제외
+    return quotes.dropna(subset=['deduction_rate']).reset_index(drop=True)
+
+
+# --- 데이터 무결성 점검 ---
+INTEGRITY_CHECKS = {
+    'orphan_product': "제품 마스터에 없는 품목",
+    'orphan_customer': "거래처 DB에 없는 거래처",
+    'duplicate_rows': "중복된 (거래처, 품목) 행",
+    'nonpositive_cost': "원가가 0 이하인 제품",
+    'below_cost': "수수료 차감 후 원가 미만 공급가",
+}
+
+
+def check_integrity(products_df, clients_df, prices_df):
+    """모든 점검을 벡터 연산(anti-join, duplicated)으로 수행. 점검 이름 -> 문제 행 DataFrame"""
+    issues = {name: pd.DataFrame() for name in INTEGRITY_CHECKS}
+    if not products_df.empty:
+        issues['nonpositive_cost'] = products_df.loc[
+            products_df['stand_cost'] <= 0, [PRODUCT_KEY, 'unique_name', 'stand_cost']
+        ]
+    if prices_df.empty or PRODUCT_KEY not in prices_df.columns:
+        return issues
+
+    price_cols = ['customer_name', PRODUCT_KEY, 'unique_name', 'supply_price']
+    prices = prices_df[price_cols]
+    issues['orphan_product'] = prices[~prices[PRODUCT_KEY].isin(products_df[PRODUCT_KEY])]
+    issues['orphan_customer'] = prices[~prices['customer_name'].isin(clients_df['customer_name'])]
+    keyed = prices[prices[PRODUCT_KEY].notna()]
+    issues['duplicate_rows'] = keyed[keyed.duplicated(['customer_name', PRODUCT_KEY], keep=False)].sort_values(['customer_name', PRODUCT_KEY])
+
+    # 지역 간선비는 선택 적용이므로 기본 수수료만 차감하여 비교
+    costed = prices.merge(products_df[[PRODUCT_KEY, 'stand_cost']], on=PRODUCT_KEY, how='inner')
+    costed['fee_rate'] = costed['customer_name'].map(customer_fee_rates(clients_df)['other_fee_rate'])
+    costed = costed.dropna(subset=['fee_rate'])
+    costed['net_settlement'] = costed['supply_price'] * (1 - costed['fee_rate'])
+    issues['below_cost'] = costed[costed['net_settlement'] < costed['stand_cost']]
+    return issues
+
+
+# --- 채널/거래처별 수익 집계 ---
+UNCLASSIFIED_CHANNEL = "미분류"
+
+
+def profit_contributions(prices_df):
+    """거래처별 합계(품목 수, 마진율 합, 손실 품목 수, 박스당 이익 합). 평균은 조회 시 합계/품목 수로 계산"""
+    if prices_df.empty or 'customer_name' not in prices_df.columns:
+        return pd.DataFrame(columns=['item_count', 'margin_sum', 'loss_count', 'profit_per_box_sum'])
+    rows = pd.DataFrame({
+        'customer_name': prices_df['customer_name'].astype(str),
+        'margin_rate': pd.to_numeric(prices_df.get('margin_rate'), errors='coerce').fillna(0).to_numpy(float),
+        'is_loss': (pd.to_numeric(prices_df.get('profit_per_ea'), errors='coerce').fillna(0) < 0).to_numpy(int),
+        'profit_per_box': pd.to_numeric(prices_df.get('profit_per_box'), errors='coerce').fillna(0).to_numpy(float),
+    })
+    return rows.groupby('customer_name').agg(
+        item_count=('customer_name', 'size'), margin_sum=('margin_rate', 'sum'),
+        loss_count=('is_loss', 'sum'), profit_per_box_sum=('profit_per_box', 'sum'),
+    )
+
+
+class ProfitAggregates:
+    """거래처별 수익 합계를 유지하는 집계 테이블.
+    처음 한 번만 전체 groupby를 수행하고, 이후 저장 시에는 해당 거래처의 기여분만 교체"""
+
+    def __init__(self, prices_df, clients_df, clients_version=None):
+        self._lock = threading.Lock()
+        self.set_channels(clients_df, clients_version)
+        self._contributions = profit_contributions(prices_df)
+
+    def set_channels(self, clients_df, clients_version=None):
+        # 거래처 -> 채널 매핑만 교체 (거래처 추가/채널 변경 시). 수익 기여분은 그대로 사용
+        channels = dict(zip(clients_df['customer_name'].astype(str), clients_df['channel_type'].astype(str)))
+        with self._lock:
+            self._channels = channels
+            self.clients_version = clients_version
+
+    def update_customer(self, customer_name, customer_prices_df):
+        # 한 거래처의 가격 행만 다시 집계하여 교체 (전체 가격 DB는 다시 읽지 않음)
+        contribution = profit_contributions(customer_prices_df)
+        with self._lock:
+            others = self._contributions.drop(index=str(customer_name), errors='ignore')
+            self._contributions = pd.concat([others, contribution]).sort_index()
+
+    @staticmethod
+    def _summarize(sums):
+        counts = sums['item_count'].replace(0, pd.NA)
+        return pd.DataFrame({
+            'item_count': sums['item_count'].astype(int),
+            'avg_margin_rate': (sums['margin_sum'] / counts).astype(float).fillna(0),
+            'loss_count': sums['loss_count'].astype(int),
+            'avg_profit_per_box': (sums['profit_per_box_sum'] / counts).astype(float).fillna(0),
+        })
+
+    def by_customer(self):
+        with self._lock:
+            sums = self._contributions.copy()
+        summary = self._summarize(sums)
+        summary.insert(0, 'channel_type', [self._channels.get(name, UNCLASSIFIED_CHANNEL) for name in summary.index])
+        return summary.rename_axis('customer_name').reset_index()
+
+    def by_channel(self):
+        with self._lock:
+            sums = self._contributions.copy()
+        channels = [self._channels.get(name, UNCLASSIFIED_CHANNEL) for name in sums.index]
+        summary = self._summarize(sums.groupby(channels).sum())
+        summary.insert(0, 'customer_count', sums.groupby(channels).size())
+        return summary.rename_axis('channel_type').reset_index()
+
+
+# --- 계산 결과 캐시 ---
+class LRUFrameCache:
+    """메모리 상한이 있는 LRU 캐시. 값은 DataFrame(또는 DataFrame을 담은 tuple)이며 꺼낸 값은 수정하지 않고 읽기만 함"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(value):
+        frames = value if isinstance(value, tuple) else (value,)
+        return sum(int(df.memory_usage(index=True, deep=True).sum()) for df in frames if isinstance(df, pd.DataFrame))
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.nbytes += size
+            # 상한을 넘으면 가장 오래 쓰지 않은 항목부터 제거
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.nbytes -= evicted_size
@@ -1,259 +1,636 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
-import gspread
-from gspread_dataframe import set_with_dataframe
-from google.oauth2.service_account import Credentials
 import time
+import secrets
+from order_volume import ingest_upload
+from search_index import SearchIndex
+from auth import LoginBusy, check_password, issue_token, verify_token
+from price_data import (
+    PRODUCT_DB_NAME, CLIENT_DB_NAME, PRICE_DB_NAME, USER_DB_NAME, PRODUCT_KEY,
+    build_shared_tables, table_view, customer_slice, prep_tables, shared_nbytes, private_nbytes,
+    check_integrity, INTEGRITY_CHECKS, ProfitAggregates, LRUFrameCache, data_version
+)
 
 # --- 페이지 설정 ---
 st.set_page_config(page_title="고래미 가격결정 시스템", layout="wide")
 
-# --- (설정) DB 정보 ---
-PRODUCT_DB_NAME = "Goremi Products DB"
-CLIENT_DB_NAME = "Goremi Clients DB"
-PRICE_DB_NAME = "Goremi Price DB"
-
 # --- 구글 시트 연동 및 데이터 로딩 ---
-@st.cache_data(ttl=300)
-def load_and_prep_data():
+def fetch_and_prep_data():
     client = get_gsheet_client()
-    # 제품 DB 로드
+    # 제품 DB, 거래처 DB, 가격 DB 로드
     products_ws = client.open(PRODUCT_DB_NAME).worksheet("products")
-    products_df = pd.DataFrame(products_ws.get_all_records())
-    products_df['unique_name'] = (
-        products_df['product_name_kr'].astype(str).str.strip() + " (" +
-        products_df['weight'].astype(str).str.strip() +
-        products_df['ea_unit'].astype(str).str.strip() + ")"
-    )
-    for col in ['stand_cost', 'stand_price_ea', 'box_ea']:
-        products_df[col] = pd.to_numeric(
-            products_df[col].astype(str).str.replace(',', '', regex=False), errors='coerce'
-        )
-    products_df = products_df.fillna(0).sort_values(by='unique_name').reset_index(drop=True)
-
-    # 거래처 DB 로드
     clients_ws = client.open(CLIENT_DB_NAME).worksheet("confirmed_clients")
-    clients_df = pd.DataFrame(clients_ws.get_all_records())
-    numeric_client_cols = [col for col in clients_df.columns if col not in ['customer_name', 'channel_type']]
-
-    # '%' 기호를 포함한 데이터 클리닝
-    for col in numeric_client_cols:
-        clients_df[col] = clients_df[col].astype(str)
-        clients_df[col] = clients_df[col].str.replace('%', '', regex=False)
-        clients_df[col] = clients_df[col].str.replace(',', '', regex=False)
-        clients_df[col] = pd.to_numeric(clients_df[col], errors='coerce')
-    clients_df = clients_df.fillna(0)
-
-    # 가격 DB 로드
     prices_ws = client.open(PRICE_DB_NAME).worksheet("confirmed_prices")
-    prices_df = pd.DataFrame(prices_ws.get_all_records())
-    return products_df, clients_df, prices_df
+    return prep_tables(
+        pd.DataFrame(products_ws.get_all_records()),
+        pd.DataFrame(clients_ws.get_all_records()),
+        pd.DataFrame(prices_ws.get_all_records()),
+    )
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def load_shared_tables():
+    # 프로세스당 한 번만 로드하여 모든 세션이 공유하는 불변 Arrow 테이블
+    return build_shared_tables(fetch_and_prep_data())
+
+def load_and_prep_data():
+    # 세션에는 공유 테이블을 복사 없이 참조하는 뷰만 전달
+    tables = load_shared_tables()["tables"]
+    return table_view(tables["products"]), table_view(tables["clients"]), table_view(tables["prices"])
+
+def load_prices_for_update():
+    # 저장 시에만 쓰는 세션 전용 가격 DB 사본
+    return load_shared_tables()["tables"]["prices"].to_pandas()
+
+def clear_data_cache():
+    load_shared_tables.clear()
 
 def get_gsheet_client():
+    # 구글 API 라이브러리는 import가 무거우므로 시트에 접근할 때 처음 불러옴
+    import gspread
+    from google.oauth2.service_account import Credentials
     scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
     creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scopes)
     return gspread.authorize(creds)
 
-# --- 메인 앱 실행 ---
-try:
-    products_df, customers_df, prices_df = load_and_prep_data()
-except Exception as e:
-    st.error(f"데이터베이스 로딩 중 오류가 발생했습니다: {e}")
+def write_sheet(db_name, worksheet_name, df):
+    from gspread_dataframe import set_with_dataframe
+    worksheet = get_gsheet_client().open(db_name).worksheet(worksheet_name)
+    set_with_dataframe(worksheet, df, allow_formulas=False)
+
+# --- 로그인 ---
+@st.cache_resource(ttl=300, show_spinner=False)
+def load_users():
+    # 사용자 아이디 -> bcrypt 해시. 모든 세션이 공유
+    users_ws = get_gsheet_client().open(USER_DB_NAME).worksheet("users")
+    users_df = pd.DataFrame(users_ws.get_all_records())
+    if users_df.empty:
+        return {}
+    return dict(zip(users_df['username'].astype(str).str.strip(), users_df['hashed_password'].astype(str).str.strip()))
+
+@st.cache_resource
+def get_auth_secret():
+    # secrets에 키가 없으면 프로세스마다 새 키 사용 (재시작 시 다시 로그인)
+    return str(st.secrets.get("auth_secret_key", "") or secrets.token_hex(32)).encode('utf-8')
+
+def require_login():
+    """로그인한 사용자 아이디를 반환. 토큰이 없거나 만료되면 로그인 화면을 띄우고 실행 중단"""
+    try:
+        users = load_users()
+    except Exception as e:
+        st.error(f"사용자 DB 로딩 중 오류가 발생했습니다: {e}")
+        st.stop()
+
+    # 매 실행마다 서명만 확인 (bcrypt는 로그인할 때 한 번만 실행)
+    username = verify_token(st.session_state.get('auth_token'), users, get_auth_secret())
+    if username:
+        return username
+
+    with st.form("login_form"):
+        input_username = st.text_input("아이디", key="login_username")
+        input_password = st.text_input("비밀번호", type="password", key="login_password")
+        submitted = st.form_submit_button("로그인", type="primary")
+
+    if submitted:
+        hashed_password = users.get(input_username.strip())
+        try:
+            is_valid = hashed_password is not None and check_password(input_password, hashed_password)
+        except LoginBusy:
+            st.warning("로그인 요청이 많습니다. 잠시 후 다시 시도해주세요.")
+            st.stop()
+        if is_valid:
+            st.session_state['auth_token'] = issue_token(input_username.strip(), hashed_password, get_auth_secret())
+            st.rerun()
+        st.error("아이디 또는 비밀번호가 올바르지 않습니다.")
     st.stop()
 
-if not prices_df.empty and 'unique_name' not in prices_df.columns:
-    st.error("🚨 데이터베이스 구조 업데이트 필요!")
-    st.warning("`Goremi Price DB`의 `confirmed_prices` 시트를 삭제하고, 앱에서 다시 설정해주세요.")
-    st.stop()
+def logout():
+    st.session_state.pop('auth_token', None)
+
+# --- 채널/거래처별 수익 집계 ---
+@st.cache_resource(ttl=3600, show_spinner=False)
+def load_profit_aggregates():
+    # 프로세스당 한 번 전체 집계 후, 저장할 때마다 해당 거래처 기여분만 갱신
+    _, customers_df, prices_df = load_and_prep_data()
+    return ProfitAggregates(prices_df, customers_df, load_shared_tables()["versions"]["clients"])
+
+def get_profit_aggregates():
+    # 거래처 데이터가 바뀌면(5분 주기 재로딩) 채널 매핑만 새로 반영하여 신규 거래처가 '미분류'로 남지 않도록 함
+    aggregates = load_profit_aggregates()
+    clients_version = load_shared_tables()["versions"]["clients"]
+    if aggregates.clients_version != clients_version:
+        aggregates.set_channels(load_and_prep_data()[1], clients_version)
+    return aggregates
+
+# --- 가격 시뮬레이션 결과 캐시 ---
+SIMULATION_CACHE_BYTES = 64 * 1024 * 1024
+
+@st.cache_resource(show_spinner=False)
+def get_simulation_cache():
+    # 거래처별 시뮬레이션 결과를 (거래처, 데이터 버전, 간선비 적용 여부, 수정된 단가) 기준으로 보관
+    return LRUFrameCache(SIMULATION_CACHE_BYTES)
+
+# --- 거래처/품목 검색 ---
+SEARCH_PLACEHOLDER = "이름, 초성(예: ㄱㄴㅁㅅ), 중량(예: 1kg)"
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_search_index(kind, version):
+    # 마스터 데이터 버전이 바뀔 때만 다시 만듦
+    products_df, customers_df, _ = load_and_prep_data()
+    names = customers_df['customer_name'] if kind == "customers" else products_df['unique_name']
+    return SearchIndex(names.astype(str).unique())
+
+def search_selectbox(label, search_index, key):
+    """검색어로 후보를 좁힌 뒤 선택하는 selectbox"""
+    query = st.text_input("🔍 검색", key=f"{key}_search", placeholder=SEARCH_PLACEHOLDER)
+    options = search_index.search(query, limit=50) if query else search_index.names
+    if query and not options:
+        st.caption("검색 결과가 없습니다.")
+    return st.selectbox(label, options, key=key)
+
+# --- 데이터 무결성 점검 ---
+@st.cache_resource(max_entries=4, show_spinner=False)
+def run_integrity_check(versions_key):
+    # 데이터 버전별로 한 번만 실행. 평소 재실행 시에는 캐시된 결과만 사용
+    return check_integrity(*load_and_prep_data())
+
+def render_integrity_report(issues):
+    total = sum(len(df) for df in issues.values())
+    if total == 0:
+        st.caption("✅ 데이터 무결성 점검: 문제 없음")
+        return
+    with st.expander(f"⚠️ 데이터 무결성 점검: {total:,}건의 문제가 발견되었습니다"):
+        for name, label in INTEGRITY_CHECKS.items():
+            if not issues[name].empty:
+                st.markdown(f"**{label}** ({len(issues[name]):,}건)")
+                st.dataframe(issues[name], hide_index=True, use_container_width=True)
+
+# --- DB 원본 조회용 서버측 페이지네이션 ---
+DB_VIEW_PAGE_SIZES = [50, 100, 200, 500]
+ALL_OPTION = "(전체)"
+# 값 종류가 이보다 많은 컬럼은 선택 목록 대신 검색어로 필터링 (전체 값 목록을 브라우저로 보내지 않음)
+FILTER_OPTION_LIMIT = 50
+
+@st.cache_resource(ttl=300, show_spinner=False, max_entries=16)
+def build_lookup_index(_df, column, version):
+    # 컬럼 값 -> 행 위치 배열. 필터링 시 전체 스캔 대신 이 인덱스로 행을 바로 꺼냄
+    if _df.empty or column not in _df.columns:
+        return {}
+    return {str(key): positions for key, positions in _df.groupby(column, sort=True).indices.items()}
+
+@st.cache_resource(ttl=300, show_spinner=False, max_entries=16)
+def build_filter_search_index(_index, column, version):
+    # 조회 인덱스의 값 목록에 대한 검색 인덱스 (부분 문자열/초성/중량 검색)
+    return SearchIndex(_index.keys())
+
+def render_table_page(df, key, index_columns=(), version=None):
+    """필터/정렬/컬럼 선택/페이지 분할을 서버에서 처리하고 현재 페이지만 브라우저로 전송"""
+    if df.empty:
+        st.info("데이터가 없습니다.")
+        return
+
+    # 1. 인덱스 기반 필터링
+    filter_cols = [col for col in index_columns if col in df.columns]
+    positions = None
+    if filter_cols:
+        cols = st.columns(len(filter_cols))
+        for col_widget, col in zip(cols, filter_cols):
+            index = build_lookup_index(df, col, version)
+            if len(index) <= FILTER_OPTION_LIMIT:
+                choice = col_widget.selectbox(col, [ALL_OPTION] + list(index.keys()), key=f"{key}_filter_{col}")
+                matched = index.get(choice) if choice != ALL_OPTION else None
+            else:
+                query = col_widget.text_input(f"{col} 검색", key=f"{key}_filter_{col}_search", placeholder=SEARCH_PLACEHOLDER)
+                matched = None
+                if query:
+                    names = build_filter_search_index(index, col, version).search(query, limit=len(index))
+                    matched = np.sort(np.concatenate([index[name] for name in names])) if names else np.array([], dtype=int)
+            if matched is not None:
+                positions = matched if positions is None else np.intersect1d(positions, matched)
+    view_df = df if positions is None else df.take(positions)
+
+    # 2. 컬럼 선택 및 정렬
+    col_select, col_sort, col_order = st.columns([3, 2, 1])
+    visible_cols = col_select.multiselect("표시할 컬럼", list(df.columns), default=list(df.columns), key=f"{key}_cols")
+    sort_col = col_sort.selectbox("정렬 기준", ["(없음)"] + list(df.columns), key=f"{key}_sort")
+    ascending = col_order.radio("정렬 방향", ["오름차순", "내림차순"], key=f"{key}_order") == "오름차순"
+    if sort_col != "(없음)":
+        view_df = view_df.sort_values(by=sort_col, ascending=ascending, kind="stable")
+
+    # 3. 페이지 분할
+    col_size, col_page = st.columns([1, 1])
+    page_size = col_size.selectbox("페이지당 행 수", DB_VIEW_PAGE_SIZES, key=f"{key}_page_size")
+    total_rows = len(view_df)
+    total_pages = max(1, -(-total_rows // page_size))
+    if st.session_state.get(f"{key}_page", 1) > total_pages:
+        st.session_state[f"{key}_page"] = 1
+    page = col_page.number_input(f"페이지 (총 {total_pages})", min_value=1, max_value=total_pages, step=1, key=f"{key}_page")
+    start = (int(page) - 1) * page_size
+    page_df = view_df.iloc[start:start + page_size][visible_cols or list(df.columns)]
+
+    st.caption(f"전체 {len(df):,}행 중 {total_rows:,}행 일치 · {start + 1 if total_rows else 0:,}–{min(start + page_size, total_rows):,}행 표시")
+    st.dataframe(page_df, use_container_width=True)
 
-# --- UI 탭 정의 ---
-st.title("🐟 goremi 가격 관리 시스템")
-tab_simulate, tab_matrix, tab_db_view = st.tabs(["가격 시뮬레이션", "거래처별 품목 관리", "DB 원본 조회"])
 
 # ==================== 가격 시뮬레이션 탭 ====================
-with tab_simulate:
+# 각 탭은 독립적으로 다시 실행되는 fragment. 위젯을 조작하면 해당 fragment만 재실행됨
+@st.fragment
+def render_simulate_tab(products_df, customers_df, data_versions):
     st.header("거래처별 품목 가격 일괄 시뮬레이션")
     if customers_df.empty:
         st.warning("등록된 거래처가 없습니다.")
-    else:
-        selected_customer_sim = st.selectbox("가격을 조정할 거래처를 선택하세요", customers_df['customer_name'].unique(), key="sim_customer")
-
-        active_prices_df = pd.DataFrame()
-        if not prices_df.empty:
-            active_prices_df = prices_df[prices_df['customer_name'] == selected_customer_sim].copy()
+        return
 
-        if active_prices_df.empty:
-            st.warning(f"'{selected_customer_sim}'이(가) 취급하는 품목이 없습니다. '거래처별 품목 관리' 탭에서 먼저 설정해주세요.")
+    selected_customer_sim = search_selectbox(
+        "가격을 조정할 거래처를 선택하세요", get_search_index("customers", data_versions["clients"]), key="sim_customer"
+    )
+    if not selected_customer_sim:
+        return
+
+    cache = get_simulation_cache()
+    sim_key = ("sim", selected_customer_sim, data_versions["prices"], data_versions["products"])
+    cached = cache.get(sim_key)
+    if cached is None:
+        active_prices_df = customer_slice(load_shared_tables()["tables"]["prices"], selected_customer_sim)
+        sim_df = pd.DataFrame()
+        if not active_prices_df.empty:
+            prices_to_merge = active_prices_df[[PRODUCT_KEY, 'supply_price']]
+            products_to_merge = products_df[[PRODUCT_KEY, 'unique_name', 'stand_cost', 'stand_price_ea', 'box_ea']]
+            sim_df = pd.merge(prices_to_merge, products_to_merge, on=PRODUCT_KEY, how='inner')
+        cached = (sim_df, len(active_prices_df))
+        cache.put(sim_key, cached)
+    sim_df, active_item_count = cached
+
+    if active_item_count == 0:
+        st.warning(f"'{selected_customer_sim}'이(가) 취급하는 품목이 없습니다. '거래처별 품목 관리' 탭에서 먼저 설정해주세요.")
+        return
+
+    if len(sim_df) < active_item_count:
+        st.warning(f"제품 마스터 DB에 없는 {active_item_count - len(sim_df)}개 품목이 시뮬레이션에서 제외되었습니다. 상단의 데이터 무결성 점검 결과를 확인해주세요.")
+
+    if sim_df.empty:
+        st.warning("시뮬레이션할 유효한 품목이 없습니다.")
+        return
+
+    customer_info = customers_df[customers_df['customer_name'] == selected_customer_sim].iloc[0]
+    render_simulation(selected_customer_sim, sim_df, customer_info, data_versions)
+
+def analyze_prices(edited_df, customer_info, apply_trunk_fee):
+    """수정된 공급 단가에 거래처 수수료를 적용한 손익 분석표"""
+    trunk_fee_rate = float(customer_info.get('지역 간선비 (%)', 0))
+
+    # =============================== 여기가 핵심 수정 부분 ===============================
+    # 1. 기타 수수료율 계산
+    other_fee_cols = [col for col in customer_info.index if col not in ['customer_name', 'channel_type', '지역 간선비 (%)']]
+    other_fee_conditions = {col: float(customer_info.get(col, 0)) for col in other_fee_cols}
+    other_fee_rate = sum(other_fee_conditions.values()) / 100
+
+    # 2. 최종 공제율 계산 (기타 수수료율 + 간선비율)
+    final_deduction_rate = other_fee_rate
+    if apply_trunk_fee:
+        final_deduction_rate += (trunk_fee_rate / 100)
+
+    # 3. 분석에 사용할 데이터프레임 타입 정리
+    analysis_df = edited_df.copy()
+    analysis_df['supply_price'] = pd.to_numeric(analysis_df['supply_price'], errors='coerce').fillna(0)
+    analysis_df['stand_price_ea'] = pd.to_numeric(analysis_df['stand_price_ea'], errors='coerce').fillna(0)
+
+    # 4. 최종 공제율을 사용하여 '실정산액' 계산
+    analysis_df['실정산액'] = analysis_df['supply_price'] * (1 - final_deduction_rate)
+
+    # 5. 이제 '개당 이익'은 올바르게 계산된 '실정산액'에서 원가만 빼면 됨
+    analysis_df['개당 이익'] = analysis_df['실정산액'] - analysis_df['stand_cost']
+    # =====================================================================================
+
+    # 이하 다른 계산들은 자동으로 올바르게 연동됨
+    def format_difference(row):
+        difference = row['실정산액'] - row['stand_price_ea']
+        if row['stand_price_ea'] > 0:
+            percentage = (difference / row['stand_price_ea']) * 100
+            return f"{difference:+,.0f}원 ({percentage:+.1f}%)"
         else:
-            prices_to_merge = active_prices_df[['unique_name', 'supply_price']]
-            products_to_merge = products_df[['unique_name', 'stand_cost', 'stand_price_ea', 'box_ea']]
-            sim_df = pd.merge(prices_to_merge, products_to_merge, on='unique_name', how='inner')
+            return f"{difference:+,.0f}원 (N/A)"
+
+    analysis_df['기준가 대비 차액'] = analysis_df.apply(format_difference, axis=1)
+    analysis_df['마진율 (%)'] = analysis_df.apply(lambda row: (row['개당 이익'] / row['실정산액'] * 100) if row['실정산액'] > 0 else 0, axis=1)
+    analysis_df['박스당 이익'] = analysis_df['개당 이익'] * analysis_df['box_ea']
+    return analysis_df
+
+@st.fragment
+def render_simulation(selected_customer_sim, sim_df, customer_info, data_versions):
+    # 단가 수정/간선비 토글 시에는 이 부분(손익 분석 결과)만 다시 계산됨
+    cache = get_simulation_cache()
+    st.markdown("---")
+    st.subheader(f"Step 1: '{selected_customer_sim}'의 공급 단가 수정")
+
+    edited_df = st.data_editor(
+        sim_df,
+        column_config={
+            "unique_name": st.column_config.TextColumn("품목명", disabled=True),
+            "stand_cost": st.column_config.NumberColumn("제품 원가", format="%d원", disabled=True),
+            "supply_price": st.column_config.NumberColumn("최종 공급 단가", format="%d원", required=True),
+            "stand_price_ea": None, "box_ea": None, PRODUCT_KEY: None,
+        },
+        hide_index=True, use_container_width=True,
+        key=f"price_editor_{selected_customer_sim}"
+    )
+
+    st.markdown("---")
+    st.subheader("Step 2: 실시간 손익 분석 결과 확인")
 
-            if sim_df.empty:
-                st.warning("시뮬레이션할 유효한 품목이 없습니다.")
+    trunk_fee_rate = float(customer_info.get('지역 간선비 (%)', 0))
+
+    apply_trunk_fee = False
+    if trunk_fee_rate > 0:
+        apply_trunk_fee = st.checkbox(f"**지역 간선비 적용 (비율: {trunk_fee_rate:,.1f}%)**", key=f"apply_trunk_fee_{selected_customer_sim}")
+
+    analysis_key = (
+        "analysis", selected_customer_sim, data_versions["prices"], data_versions["products"], data_versions["clients"],
+        apply_trunk_fee, data_version(edited_df[[PRODUCT_KEY, 'supply_price']])
+    )
+    analysis_df = cache.get(analysis_key)
+    if analysis_df is None:
+        analysis_df = analyze_prices(edited_df, customer_info, apply_trunk_fee)
+        cache.put(analysis_key, analysis_df)
+    st.session_state['sim_private_nbytes'] = private_nbytes(sim_df, analysis_df)
+
+    display_cols = ['unique_name', 'stand_cost', 'stand_price_ea', 'supply_price', '실정산액', '기준가 대비 차액', '마진율 (%)', '개당 이익', '박스당 이익']
+    st.dataframe(
+        analysis_df[display_cols],
+        column_config={
+            "unique_name": "품목명",
+            "stand_cost": st.column_config.NumberColumn("제품 원가", format="%d원"),
+            "stand_price_ea": st.column_config.NumberColumn("기준 도매가", format="%d원"),
+            "supply_price": st.column_config.NumberColumn("공급 단가", format="%d원"),
+            "실정산액": st.column_config.NumberColumn("실정산액", format="%d원"),
+            "기준가 대비 차액": st.column_config.TextColumn("기준가 대비 차액"),
+            "마진율 (%)": st.column_config.NumberColumn("마진율", format="%.1f%%"),
+            "개당 이익": st.column_config.NumberColumn("개당 이익", format="%d원"),
+            "박스당 이익": st.column_config.NumberColumn("박스당 이익", format="%d원"),
+        },
+        hide_index=True, use_container_width=True
+    )
+
+    st.markdown("---")
+    if st.button(f"✅ '{selected_customer_sim}'의 모든 가격 변경사항 DB에 저장", key="save_all_sim", type="primary"):
+        with st.spinner("DB에 가격 정보를 업데이트합니다..."):
+            current_total_prices = load_prices_for_update()
+            other_customer_prices = current_total_prices[current_total_prices['customer_name'] != selected_customer_sim]
+            customer_rows = current_total_prices[current_total_prices['customer_name'] == selected_customer_sim]
+            # 시뮬레이션에서 제외된 행(sku_code가 없거나 제품 마스터에 없는 품목)은 수정하지 않고 그대로 유지
+            excluded_rows = customer_rows[~customer_rows[PRODUCT_KEY].isin(analysis_df[PRODUCT_KEY])]
+            updated_data_to_save = analysis_df.rename(columns={'마진율 (%)': 'margin_rate', '개당 이익': 'profit_per_ea', '박스당 이익': 'profit_per_box'})
+            updated_data_to_save['customer_name'] = selected_customer_sim
+            updated_data_to_save['confirm_date'] = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+            if not current_total_prices.empty:
+                save_columns = list(current_total_prices.columns)
+                # 분석에만 사용된 컬럼은 저장하지 않도록 필터링
+                final_save_df = updated_data_to_save[[col for col in save_columns if col in updated_data_to_save.columns]]
             else:
-                st.markdown("---")
-                st.subheader(f"Step 1: '{selected_customer_sim}'의 공급 단가 수정")
-
-                edited_df = st.data_editor(
-                    sim_df,
-                    column_config={
-                        "unique_name": st.column_config.TextColumn("품목명", disabled=True),
-                        "stand_cost": st.column_config.NumberColumn("제품 원가", format="%d원", disabled=True),
-                        "supply_price": st.column_config.NumberColumn("최종 공급 단가", format="%d원", required=True),
-                        "stand_price_ea": None, "box_ea": None,
-                    },
-                    hide_index=True, use_container_width=True,
-                    key=f"price_editor_{selected_customer_sim}"
-                )
+                final_save_df = updated_data_to_save
 
-                st.markdown("---")
-                st.subheader("Step 2: 실시간 손익 분석 결과 확인")
-                customer_info = customers_df[customers_df['customer_name'] == selected_customer_sim].iloc[0]
-
-                trunk_fee_rate = float(customer_info.get('지역 간선비 (%)', 0))
-
-                apply_trunk_fee = False
-                if trunk_fee_rate > 0:
-                    apply_trunk_fee = st.checkbox(f"**지역 간선비 적용 (비율: {trunk_fee_rate:,.1f}%)**", key=f"apply_trunk_fee_{selected_customer_sim}")
-
-                # =============================== 여기가 핵심 수정 부분 ===============================
-                # 1. 기타 수수료율 계산
-                other_fee_cols = [col for col in customer_info.index if col not in ['customer_name', 'channel_type', '지역 간선비 (%)']]
-                other_fee_conditions = {col: float(customer_info.get(col, 0)) for col in other_fee_cols}
-                other_fee_rate = sum(other_fee_conditions.values()) / 100
-
-                # 2. 최종 공제율 계산 (기타 수수료율 + 간선비율)
-                final_deduction_rate = other_fee_rate
-                if apply_trunk_fee:
-                    final_deduction_rate += (trunk_fee_rate / 100)
-
-                # 3. 분석에 사용할 데이터프레임 복사 및 타입 정리
-                analysis_df = edited_df.copy()
-                analysis_df['supply_price'] = pd.to_numeric(analysis_df['supply_price'], errors='coerce').fillna(0)
-                analysis_df['stand_price_ea'] = pd.to_numeric(analysis_df['stand_price_ea'], errors='coerce').fillna(0)
-
-                # 4. 최종 공제율을 사용하여 '실정산액' 계산
-                analysis_df['실정산액'] = analysis_df['supply_price'] * (1 - final_deduction_rate)
-
-                # 5. 이제 '개당 이익'은 올바르게 계산된 '실정산액'에서 원가만 빼면 됨
-                analysis_df['개당 이익'] = analysis_df['실정산액'] - analysis_df['stand_cost']
-                # =====================================================================================
-
-                # 이하 다른 계산들은 자동으로 올바르게 연동됨
-                def format_difference(row):
-                    difference = row['실정산액'] - row['stand_price_ea']
-                    if row['stand_price_ea'] > 0:
-                        percentage = (difference / row['stand_price_ea']) * 100
-                        return f"{difference:+,.0f}원 ({percentage:+.1f}%)"
-                    else:
-                        return f"{difference:+,.0f}원 (N/A)"
-
-                analysis_df['기준가 대비 차액'] = analysis_df.apply(format_difference, axis=1)
-                analysis_df['마진율 (%)'] = analysis_df.apply(lambda row: (row['개당 이익'] / row['실정산액'] * 100) if row['실정산액'] > 0 else 0, axis=1)
-                analysis_df['박스당 이익'] = analysis_df['개당 이익'] * analysis_df['box_ea']
-
-                display_cols = ['unique_name', 'stand_cost', 'stand_price_ea', 'supply_price', '실정산액', '기준가 대비 차액', '마진율 (%)', '개당 이익', '박스당 이익']
-                st.dataframe(
-                    analysis_df[display_cols],
-                    column_config={
-                        "unique_name": "품목명",
-                        "stand_cost": st.column_config.NumberColumn("제품 원가", format="%d원"),
-                        "stand_price_ea": st.column_config.NumberColumn("기준 도매가", format="%d원"),
-                        "supply_price": st.column_config.NumberColumn("공급 단가", format="%d원"),
-                        "실정산액": st.column_config.NumberColumn("실정산액", format="%d원"),
-                        "기준가 대비 차액": st.column_config.TextColumn("기준가 대비 차액"),
-                        "마진율 (%)": st.column_config.NumberColumn("마진율", format="%.1f%%"),
-                        "개당 이익": st.column_config.NumberColumn("개당 이익", format="%d원"),
-                        "박스당 이익": st.column_config.NumberColumn("박스당 이익", format="%d원"),
-                    },
-                    hide_index=True, use_container_width=True
-                )
+            customer_prices_df = pd.concat([excluded_rows, final_save_df], ignore_index=True)
+            final_prices_df = pd.concat([other_customer_prices, customer_prices_df], ignore_index=True)
+            write_sheet(PRICE_DB_NAME, "confirmed_prices", final_prices_df)
+            get_profit_aggregates().update_customer(selected_customer_sim, customer_prices_df)
 
-                st.markdown("---")
-                if st.button(f"✅ '{selected_customer_sim}'의 모든 가격 변경사항 DB에 저장", key="save_all_sim", type="primary"):
-                    with st.spinner("DB에 가격 정보를 업데이트합니다..."):
-                        _, _, current_total_prices = load_and_prep_data()
-                        other_customer_prices = current_total_prices[current_total_prices['customer_name'] != selected_customer_sim].copy()
-                        updated_data_to_save = analysis_df.rename(columns={'마진율 (%)': 'margin_rate', '개당 이익': 'profit_per_ea', '박스당 이익': 'profit_per_box'})
-                        updated_data_to_save['customer_name'] = selected_customer_sim
-                        updated_data_to_save['confirm_date'] = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-                        if not current_total_prices.empty:
-                            save_columns = list(current_total_prices.columns)
-                            # 분석에만 사용된 컬럼은 저장하지 않도록 필터링
-                            final_save_df = updated_data_to_save[[col for col in save_columns if col in updated_data_to_save.columns]]
-                        else:
-                            final_save_df = updated_data_to_save
-
-                        final_prices_df = pd.concat([other_customer_prices, final_save_df], ignore_index=True)
-                        price_sheet = get_gsheet_client().open(PRICE_DB_NAME).worksheet("confirmed_prices")
-                        set_with_dataframe(price_sheet, final_prices_df, allow_formulas=False)
-
-                        st.success(f"'{selected_customer_sim}'의 가격 정보가 성공적으로 업데이트되었습니다.")
-                        st.cache_data.clear()
-                        time.sleep(1)
-                        st.rerun()
+            st.success(f"'{selected_customer_sim}'의 가격 정보가 성공적으로 업데이트되었습니다.")
+            clear_data_cache()
+            time.sleep(1)
+            st.rerun()
 
 # ==================== 거래처별 품목 관리 탭 ====================
-with tab_matrix:
+def toggle_matrix_product(selection_key, sku_code, widget_key):
+    # 검색으로 가려진 품목의 선택 상태도 유지되도록 세션에 따로 보관
+    if st.session_state[widget_key]:
+        st.session_state[selection_key].add(sku_code)
+    else:
+        st.session_state[selection_key].discard(sku_code)
+
+@st.fragment
+def render_matrix_tab(products_df, customers_df, prices_df, data_versions):
     st.header("거래처별 취급 품목 설정")
     if customers_df.empty:
         st.warning("등록된 거래처가 없습니다.")
-    else:
-        manage_customer = st.selectbox("관리할 거래처를 선택하세요", customers_df['customer_name'].unique(), key="manage_customer")
-        if manage_customer:
-            st.markdown(f"#### 📄 **{manage_customer}** 의 취급 품목 목록")
-            active_products_set = set()
-            if not prices_df.empty and 'unique_name' in prices_df.columns:
-                active_products_set = set(prices_df[prices_df['customer_name'] == manage_customer]['unique_name'])
-
-            checkbox_states = {}
-            for _, product in products_df.iterrows():
-                is_checked = product['unique_name'] in active_products_set
-                checkbox_states[product['unique_name']] = st.checkbox(
-                    product['unique_name'],
-                    value=is_checked, key=f"check_{manage_customer}_{product['unique_name']}"
-                )
+        return
+
+    manage_customer = search_selectbox(
+        "관리할 거래처를 선택하세요", get_search_index("customers", data_versions["clients"]), key="manage_customer"
+    )
+    if not manage_customer:
+        return
+
+    st.markdown(f"#### 📄 **{manage_customer}** 의 취급 품목 목록")
+    active_products_set = set()
+    if not prices_df.empty and PRODUCT_KEY in prices_df.columns:
+        active_products_set = set(customer_slice(load_shared_tables()["tables"]["prices"], manage_customer)[PRODUCT_KEY].dropna())
+
+    # 선택 목록과 체크박스 위젯 키 모두 가격 데이터 버전을 포함. 다른 사용자가 저장하면 둘 다 DB 기준으로 새로 만들어짐
+    matrix_key = f"{manage_customer}_{data_versions['prices']}"
+    selection_key = f"matrix_selection_{matrix_key}"
+    if selection_key not in st.session_state:
+        st.session_state[selection_key] = set(active_products_set)
+    selected_products = st.session_state[selection_key]
+
+    product_query = st.text_input("🔍 품목 검색", key=f"matrix_search_{manage_customer}", placeholder=SEARCH_PLACEHOLDER)
+    visible_products = products_df
+    if product_query:
+        product_index = get_search_index("products", data_versions["products"])
+        visible_products = products_df[products_df['unique_name'].isin(product_index.search(product_query, limit=len(product_index)))]
+        st.caption(f"{len(visible_products):,}개 품목 표시 · 선택된 품목 {len(selected_products):,}개")
+
+    for sku_code, unique_name in zip(visible_products[PRODUCT_KEY], visible_products['unique_name']):
+        widget_key = f"check_{matrix_key}_{sku_code}"
+        st.checkbox(
+            unique_name,
+            value=sku_code in selected_products, key=widget_key,
+            on_change=toggle_matrix_product, args=(selection_key, sku_code, widget_key)
+        )
 
-            if st.button(f"✅ **{manage_customer}** 의 품목 정보 저장", use_container_width=True, type="primary"):
-                with st.spinner("DB를 업데이트하는 중입니다..."):
-                    _, _, current_prices = load_and_prep_data()
-                    other_customer_prices = current_prices[current_prices['customer_name'] != manage_customer].copy()
-                    newly_active_products = {name for name, checked in checkbox_states.items() if checked}
-                    reconstructed_entries = []
-                    for unique_name in newly_active_products:
-                        existing_entry = current_prices[
-                            (current_prices['customer_name'] == manage_customer) &
-                            (current_prices['unique_name'] == unique_name)
-                        ]
-                        if not existing_entry.empty:
-                            reconstructed_entries.append(existing_entry.iloc[0].to_dict())
-                        else:
-                            product_info = products_df.loc[products_df['unique_name'] == unique_name].iloc[0]
-                            reconstructed_entries.append({
-                                "confirm_date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                                "unique_name": unique_name, "customer_name": manage_customer,
-                                "stand_cost": product_info['stand_cost'], "supply_price": product_info['stand_price_ea'],
-                                "margin_rate": 0, "profit_per_ea": 0, "profit_per_box": 0
-                            })
-
-                    reconstructed_df = pd.DataFrame(reconstructed_entries)
-                    final_df = pd.concat([other_customer_prices, reconstructed_df], ignore_index=True)
-                    price_sheet = get_gsheet_client().open(PRICE_DB_NAME).worksheet("confirmed_prices")
-                    set_with_dataframe(price_sheet, final_df, allow_formulas=False)
-
-                    st.success(f"'{manage_customer}'의 취급 품목 정보가 DB에 성공적으로 업데이트되었습니다!")
-                    st.cache_data.clear()
-                    time.sleep(1)
-                    st.rerun()
+    if st.button(f"✅ **{manage_customer}** 의 품목 정보 저장", use_container_width=True, type="primary"):
+        with st.spinner("DB를 업데이트하는 중입니다..."):
+            current_prices = load_prices_for_update()
+            other_customer_prices = current_prices[current_prices['customer_name'] != manage_customer]
+            customer_rows = current_prices[current_prices['customer_name'] == manage_customer]
+            # sku_code가 없는 행(제품 마스터와 매칭되지 않은 구 데이터)은 체크박스 대상이 아니므로 그대로 유지
+            unkeyed_rows = customer_rows[customer_rows[PRODUCT_KEY].isna()]
+            newly_active_products = set(selected_products)
+            existing_entries = (
+                customer_rows.drop(unkeyed_rows.index)
+                .drop_duplicates(PRODUCT_KEY).set_index(PRODUCT_KEY, drop=False)
+            )
+            products_by_key = products_df.set_index(PRODUCT_KEY, drop=False)
+            reconstructed_entries = []
+            for sku_code in newly_active_products:
+                if sku_code in existing_entries.index:
+                    reconstructed_entries.append(existing_entries.loc[sku_code].to_dict())
+                else:
+                    product_info = products_by_key.loc[sku_code]
+                    reconstructed_entries.append({
+                        "confirm_date": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                        PRODUCT_KEY: sku_code, "unique_name": product_info['unique_name'], "customer_name": manage_customer,
+                        "stand_cost": product_info['stand_cost'], "supply_price": product_info['stand_price_ea'],
+                        "margin_rate": 0, "profit_per_ea": 0, "profit_per_box": 0
+                    })
+
+            reconstructed_df = pd.DataFrame(reconstructed_entries)
+            # 시트에 쓰는 이 거래처의 행 전체로 집계를 갱신해야 전체 재집계 결과와 일치함
+            customer_prices_df = pd.concat([unkeyed_rows, reconstructed_df], ignore_index=True)
+            final_df = pd.concat([other_customer_prices, customer_prices_df], ignore_index=True)
+            write_sheet(PRICE_DB_NAME, "confirmed_prices", final_df)
+            get_profit_aggregates().update_customer(manage_customer, customer_prices_df)
+            st.session_state.pop(selection_key, None)
+
+            st.success(f"'{manage_customer}'의 취급 품목 정보가 DB에 성공적으로 업데이트되었습니다!")
+            clear_data_cache()
+            time.sleep(1)
+            st.rerun()
 
 # ==================== DB 원본 조회 탭 ====================
-with tab_db_view:
+@st.fragment
+def render_db_view_tab(products_df, customers_df, prices_df, data_versions):
     st.header("제품 마스터 DB")
-    st.dataframe(products_df)
+    render_table_page(products_df, "db_products", index_columns=['unique_name'], version=data_versions["products"])
     st.header("거래처 목록 DB")
-    st.dataframe(customers_df)
+    render_table_page(customers_df, "db_customers", index_columns=['channel_type'], version=data_versions["clients"])
     st.header("확정 가격 DB (취급 품목 목록)")
-    st.dataframe(prices_df)
+    render_table_page(prices_df, "db_prices", index_columns=['customer_name', 'unique_name'], version=data_versions["prices"])
+
+    st.header("메모리 사용량")
+    col_shared, col_private, col_cache = st.columns(3)
+    col_shared.metric("공유 마스터 데이터 (프로세스당 1회)", f"{shared_nbytes(load_shared_tables()) / 1024:,.1f} KB")
+    session_bytes = private_nbytes(products_df, customers_df, prices_df) + st.session_state.get('sim_private_nbytes', 0)
+    col_private.metric("이 세션 전용 데이터", f"{session_bytes / 1024:,.1f} KB")
+    sim_cache = get_simulation_cache()
+    lookups = sim_cache.hits + sim_cache.misses
+    col_cache.metric(
+        "시뮬레이션 결과 캐시", f"{sim_cache.nbytes / 1024:,.1f} KB",
+        f"{len(sim_cache)}건 · 적중률 {sim_cache.hits / lookups * 100:.0f}%" if lookups else f"{len(sim_cache)}건",
+        delta_color="off"
+    )
+
+# ==================== 수익 현황 탭 ====================
+@st.fragment
+def render_profit_tab():
+    st.header("채널/거래처별 수익 현황")
+    aggregates = get_profit_aggregates()
+    summary_config = {
+        "item_count": st.column_config.NumberColumn("품목 수"),
+        "avg_margin_rate": st.column_config.NumberColumn("평균 마진율", format="%.1f%%"),
+        "loss_count": st.column_config.NumberColumn("손실 품목 수"),
+        "avg_profit_per_box": st.column_config.NumberColumn("평균 박스당 이익", format="%d원"),
+    }
+
+    st.subheader("채널 유형별")
+    st.dataframe(
+        aggregates.by_channel(),
+        column_config={"channel_type": "채널 유형", "customer_count": st.column_config.NumberColumn("거래처 수"), **summary_config},
+        hide_index=True, use_container_width=True
+    )
+    st.subheader("거래처별")
+    st.dataframe(
+        aggregates.by_customer(),
+        column_config={"customer_name": "거래처명", "channel_type": "채널 유형", **summary_config},
+        hide_index=True, use_container_width=True
+    )
+    st.button("🔄 전체 다시 집계", key="rebuild_profit_aggregates", on_click=load_profit_aggregates.clear)
+
+    st.markdown("---")
+    st.subheader("주문량 기반 총 이익")
+    st.caption("주문/출고 로그(JSON Lines 또는 CSV: customer_name, sku_code 또는 unique_name, quantity, order_date)를 올리면 기간 내 총 이익을 계산합니다.")
+    order_file = st.file_uploader("주문 로그 파일", type=["jsonl", "json", "csv"], key="order_log")
+    col_from, col_to, col_trunk = st.columns([1, 1, 1])
+    date_from = col_from.date_input("시작일", value=None, key="order_date_from")
+    date_to = col_to.date_input("종료일", value=None, key="order_date_to")
+    apply_trunk_fee = col_trunk.checkbox("지역 간선비 적용", key="order_apply_trunk_fee")
+    if order_file is not None:
+        # 같은 파일/조건/데이터 버전이면 이전 집계 결과를 재사용 (다른 버튼으로 fragment가 재실행될 때 다시 읽지 않음)
+        ingest_key = (
+            order_file.file_id, date_from, date_to, apply_trunk_fee,
+            tuple(sorted(load_shared_tables()["versions"].items()))
+        )
+        cached = st.session_state.get('order_ingest')
+        if cached is not None and cached[0] == ingest_key:
+            result = cached[1]
+        else:
+            products_df, customers_df, prices_df = load_and_prep_data()
+            with st.spinner("주문 로그를 집계하는 중입니다..."):
+                result = ingest_upload(
+                    order_file, products_df, customers_df, prices_df,
+                    date_from=date_from.isoformat() if date_from else None,
+                    date_to=date_to.isoformat() if date_to else None,
+                    apply_trunk_fee=apply_trunk_fee,
+                )
+            st.session_state['order_ingest'] = (ingest_key, result)
+        stats = result['stats']
+        st.caption(f"{stats.get('lines', 0):,}줄 처리 · 기간 외 {stats.get('out_of_period', 0):,} · 오류 {stats.get('invalid', 0):,}")
+        if not result['unresolved'].empty or not result['unpriced'].empty:
+            st.warning(f"제품 마스터에 없는 품목 {len(result['unresolved']):,}쌍, 확정 가격이 없는 품목 {len(result['unpriced']):,}쌍은 제외되었습니다.")
+        money = lambda label: st.column_config.NumberColumn(label, format="%d원")
+        st.dataframe(
+            result['customers'],
+            column_config={
+                "customer_name": "거래처명", "quantity": st.column_config.NumberColumn("총 수량"),
+                "total_sales": money("총 공급액"), "total_profit": money("총 이익"),
+                "profit_rate": st.column_config.NumberColumn("이익률", format="%.1f%%"),
+            },
+            hide_index=True, use_container_width=True
+        )
+        st.dataframe(
+            result['profit'],
+            column_config={
+                "customer_name": "거래처명", "unique_name": "품목명", PRODUCT_KEY: None,
+                "quantity": st.column_config.NumberColumn("총 수량"), "supply_price": money("공급 단가"),
+                "net_settlement": money("실정산액"), "profit_per_ea": money("개당 이익"),
+                "total_sales": money("총 공급액"), "total_net_settlement": money("총 실정산액"), "total_profit": money("총 이익"),
+            },
+            hide_index=True, use_container_width=True
+        )
+
+# --- 메인 앱 실행 ---
+# 제목/사이드바/탭 틀을 먼저 그린 뒤 데이터를 불러옴 (데이터 로딩 중에도 화면이 바로 보이도록)
+st.title("🐟 goremi 가격 관리 시스템")
+current_user = require_login()
+st.sidebar.markdown(f"👤 **{current_user}**")
+st.sidebar.button("로그아웃", on_click=logout)
+
+status_area = st.container()
+# on_change="rerun"으로 선택된 탭만 실행 (보이지 않는 탭은 계산하지 않음)
+tab_simulate, tab_matrix, tab_profit, tab_db_view = st.tabs(
+    ["가격 시뮬레이션", "거래처별 품목 관리", "수익 현황", "DB 원본 조회"], key="main_tab", on_change="rerun"
+)
+
+with status_area:
+    try:
+        with st.spinner("데이터를 불러오는 중입니다..."):
+            products_df, customers_df, prices_df = load_and_prep_data()
+            data_versions = load_shared_tables()["versions"]
+    except Exception as e:
+        st.error(f"데이터베이스 로딩 중 오류가 발생했습니다: {e}")
+        st.stop()
+
+    if not prices_df.empty and 'unique_name' not in prices_df.columns:
+        st.error("🚨 데이터베이스 구조 업데이트 필요!")
+        st.warning("`Goremi Price DB`의 `confirmed_prices` 시트가 구 스키마(product_name 기준)입니다. "
+                   "시트를 CSV로 내려받아 `python migrate_prices.py <파일> --to-sheet`로 변환해주세요.")
+        st.stop()
+
+    render_integrity_report(run_integrity_check(tuple(sorted(data_versions.items()))))
+
+with tab_simulate:
+    if tab_simulate.open:
+        render_simulate_tab(products_df, customers_df, data_versions)
+
+with tab_matrix:
+    if tab_matrix.open:
+        render_matrix_tab(products_df, customers_df, prices_df, data_versions)
+
+with tab_profit:
+    if tab_profit.open:
+        render_profit_tab()
+
+with tab_db_view:
+    if tab_db_view.open:
+        render_db_view_tab(products_df, customers_df, prices_df, data_versions)
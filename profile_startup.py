@@ -0,0 +1,123 @@
+# profile_startup.py
+# price_gen.py 시작 시간 측정: (1) 모듈 최상단 import 시간, (2) 첫 화면(제목)이 그려지기까지의 시간과 전체 실행 시간
+#
+# 사용법:
+#   python profile_startup.py                                  # import 시간 + 로그인 화면
+#   python profile_startup.py --username admin --password ...  # 로그인 후 메인 화면까지 (secrets.toml 필요)
+#
+# import 측정은 새 인터프리터에서 python -X importtime으로 실행하므로 이 스크립트의 import와 섞이지 않음
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import time
+import tomllib
+
+from price_data import SECRETS_PATH
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_gen.py")
+# 시작 경로에서 불러오면 안 되는 무거운 I/O 라이브러리 (시트에 접근할 때만 import)
+LAZY_MODULES = ("gspread", "gspread_dataframe", "google")
+
+
+def startup_imports(app_path=APP_PATH):
+    """앱 스크립트의 모듈 최상단 import 문 (함수 안의 import는 제외)"""
+    with open(app_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def profile_imports(statements):
+    """새 인터프리터에서 import 문을 실행하고 최상위 패키지별 누적 시간(us)을 반환"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(statements)],
+        capture_output=True, text=True, cwd=os.path.dirname(APP_PATH),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    packages = {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("  "):
+            continue  # 최상위 import만 (하위 import는 들여쓰기가 더 깊음)
+        packages[name.strip()] = int(cumulative)
+    return packages
+
+
+def profile_first_paint(username=None, password=None, runs=2, secrets_path=SECRETS_PATH):
+    """AppTest로 앱을 실행하고 실행별 (첫 화면 시간, 전체 시간, 오류)를 반환. 첫 실행이 콜드 스타트"""
+    from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+    from streamlit.testing.v1 import AppTest
+
+    first_delta = {}
+    enqueue = ForwardMsgQueue.enqueue
+
+    def timed_enqueue(queue, msg):
+        if msg.WhichOneof("type") == "delta" and "at" not in first_delta:
+            first_delta["at"] = time.perf_counter()
+        return enqueue(queue, msg)
+
+    ForwardMsgQueue.enqueue = timed_enqueue
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=120)
+        if os.path.exists(secrets_path):
+            with open(secrets_path, "rb") as f:
+                for key, value in tomllib.load(f).items():
+                    at.secrets[key] = value
+        if username:
+            at.session_state["login_username"] = username
+            at.session_state["login_password"] = password or ""
+
+        timings = []
+        for i in range(runs):
+            first_delta.clear()
+            started = time.perf_counter()
+            if i == 0 and username:
+                # 로그인 폼 제출 후 메인 화면까지를 첫 실행으로 측정
+                at.run()
+                first_delta.clear()
+                started = time.perf_counter()
+                at.button[0].click().run()
+            else:
+                at.run()
+            finished = time.perf_counter()
+            error = at.exception[0].value if at.exception else (at.error[0].value if at.error else None)
+            timings.append((first_delta.get("at", finished) - started, finished - started, error))
+        return timings
+    finally:
+        ForwardMsgQueue.enqueue = enqueue
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="price_gen.py 시작 시간 측정")
+    parser.add_argument("--username", help="로그인 후 메인 화면까지 측정할 계정")
+    parser.add_argument("--password")
+    parser.add_argument("--runs", type=int, default=2, help="실행 횟수 (첫 실행은 콜드, 이후는 재실행)")
+    parser.add_argument("--top", type=int, default=10, help="표시할 import 수")
+    parser.add_argument("--credentials", default=SECRETS_PATH, help="secrets.toml 경로")
+    args = parser.parse_args(argv)
+
+    statements = startup_imports()
+    packages = profile_imports(statements)
+    total = sum(packages.values())
+    print(f"--- 시작 import ({len(statements)}개 문, 합계 {total / 1000:,.1f}ms) ---")
+    for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:8,.1f}ms  {name}")
+    eager = [name for name in packages if name.split(".")[0] in LAZY_MODULES]
+    if eager:
+        print(f"⚠️ 시작 경로에서 불러오는 I/O 라이브러리: {', '.join(eager)}")
+
+    print("\n--- 첫 화면 ---")
+    for i, (first_paint, elapsed, error) in enumerate(profile_first_paint(args.username, args.password, args.runs, args.credentials)):
+        label = "콜드 실행" if i == 0 else f"재실행 {i}"
+        print(f"  {label:<8} 첫 화면 {first_paint * 1000:8,.1f}ms · 전체 {elapsed * 1000:8,.1f}ms")
+        if error:
+            print(f"           (앱 메시지: {str(error).splitlines()[0][:100]})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
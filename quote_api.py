@@ -0,0 +1,222 @@
+# quote_api.py
+# 주문 입력/ERP 연동 등 내부 도구용 가격 조회 HTTP/JSON 서비스
+# 제품/거래처/확정 가격을 메모리 인덱스로 올려두고, 가격 시뮬레이션 탭과 같은 수수료 로직으로 실정산액과 마진을 응답
+#
+# 사용법:
+#   python quote_api.py --port 8600                                   # 구글 시트에서 로드
+#   python quote_api.py --products p.csv --clients c.csv --prices pr.csv  # 로컬 CSV로 실행
+#
+#   GET  /quote?customer=쿠팡&product=GRM-001[&trunk_fee=1]   (product는 sku_code 또는 unique_name)
+#   POST /quotes  {"trunk_fee": false, "items": [{"customer": "쿠팡", "product": "GRM-001"}, ...]}
+#   GET  /health
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from price_data import PRODUCT_KEY, SECRETS_PATH, data_version, load_csv_tables, load_sheet_tables, quote_table
+
+DEFAULT_REFRESH_SECONDS = 300
+MAX_BATCH_ITEMS = 5000
+# 요청 본문 상한. 항목당 넉넉히 512바이트로 잡음
+MAX_BODY_BYTES = MAX_BATCH_ITEMS * 512
+QUOTE_FIELDS = ['customer_name', PRODUCT_KEY, 'unique_name', 'supply_price', 'stand_cost', 'deduction_rate',
+                'net_settlement', 'profit_per_ea', 'margin_rate', 'profit_per_box']
+
+
+def parse_flag(value):
+    """요청의 trunk_fee 값 -> bool. true/false, 1/0 외의 값은 ValueError"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("1", "true", "0", "false", ""):
+        return value.strip().lower() in ("1", "true")
+    raise ValueError(f"trunk_fee 값이 올바르지 않습니다: {value!r}")
+
+
+def parse_batch(request):
+    """POST /quotes 본문 검증. (trunk_fee, [(customer, product), ...]) 반환, 형식이 틀리면 ValueError"""
+    if not isinstance(request, dict) or not isinstance(request.get("items"), list):
+        raise ValueError("items 목록이 필요합니다.")
+    items = request["items"]
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f"한 번에 최대 {MAX_BATCH_ITEMS}건까지 조회할 수 있습니다.")
+    pairs = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("customer"), str) or not isinstance(item.get("product"), str):
+            raise ValueError(f"items[{i}]에는 문자열 customer와 product가 필요합니다.")
+        pairs.append((item["customer"], item["product"]))
+    return parse_flag(request.get("trunk_fee", False)), pairs
+
+
+class QuoteIndex:
+    """(거래처, sku_code) -> 견적 dict. 만들어진 뒤에는 변경하지 않으므로 여러 스레드에서 잠금 없이 읽음"""
+
+    def __init__(self, products_df, clients_df, prices_df):
+        self.versions = {name: data_version(df) for name, df in
+                         [("products", products_df), ("clients", clients_df), ("prices", prices_df)]}
+        self.loaded_at = datetime.now().isoformat(timespec='seconds')
+        self._name_to_key = dict(zip(products_df['unique_name'].astype(str), products_df[PRODUCT_KEY].astype(str)))
+        self._quotes = {}
+        for apply_trunk_fee in (False, True):
+            quotes = quote_table(products_df, clients_df, prices_df, apply_trunk_fee=apply_trunk_fee)
+            quotes = quotes.drop_duplicates(['customer_name', PRODUCT_KEY], keep='last')[QUOTE_FIELDS]
+            self._quotes[apply_trunk_fee] = {
+                (record['customer_name'], record[PRODUCT_KEY]): record for record in quotes.to_dict('records')
+            }
+
+    def __len__(self):
+        return len(self._quotes[False])
+
+    def quote(self, customer, product, trunk_fee=False):
+        sku_code = self._name_to_key.get(product, product)
+        return self._quotes[bool(trunk_fee)].get((customer, sku_code))
+
+
+class QuoteService:
+    """현재 인덱스를 들고 있다가 백그라운드에서 주기적으로 새 인덱스를 만들어 통째로 교체"""
+
+    def __init__(self, load_tables, refresh_seconds=DEFAULT_REFRESH_SECONDS):
+        self._load_tables = load_tables
+        self.refresh_seconds = refresh_seconds
+        self.index = QuoteIndex(*load_tables())
+        self.last_error = None
+        self._stop = threading.Event()
+
+    def refresh(self):
+        try:
+            self.index = QuoteIndex(*self._load_tables())
+            self.last_error = None
+        except Exception as e:
+            # 새로 읽기에 실패하면 기존 인덱스로 계속 응답
+            self.last_error = f"{type(e).__name__}: {e}"
+
+    def start_refresher(self):
+        def loop():
+            while not self._stop.wait(self.refresh_seconds):
+                self.refresh()
+        threading.Thread(target=loop, name="quote-refresher", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def make_handler(service):
+    class QuoteHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 헤더와 본문이 나눠 전송될 때 Nagle 알고리즘으로 keep-alive 응답이 ~40ms 지연되는 것을 방지
+        disable_nagle_algorithm = True
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            index = service.index
+            if url.path == "/health":
+                self._send_json(200, {"status": "ok", "quotes": len(index), "versions": index.versions,
+                                      "loaded_at": index.loaded_at, "last_error": service.last_error})
+            elif url.path == "/quote":
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if not params.get("customer") or not params.get("product"):
+                    self._send_json(400, {"error": "customer와 product는 필수입니다."})
+                    return
+                try:
+                    trunk_fee = parse_flag(params.get("trunk_fee", False))
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+                quote = index.quote(params["customer"], params["product"], trunk_fee)
+                if quote is None:
+                    self._send_json(404, {"error": "확정 가격이 없습니다.", "customer": params["customer"], "product": params["product"]})
+                else:
+                    self._send_json(200, quote)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/quotes":
+                self._send_json(404, {"error": "not found"})
+                return
+            # 본문을 읽기 전에 길이 확인 (음수면 read()가 연결이 끊길 때까지 대기함)
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                length = -1
+            if length < 0 or length > MAX_BODY_BYTES:
+                # 읽지 않은 본문이 남으므로 연결을 닫음
+                self.close_connection = True
+                if length < 0:
+                    self._send_json(400, {"error": "Content-Length가 올바르지 않습니다."})
+                else:
+                    self._send_json(413, {"error": f"요청 본문은 최대 {MAX_BODY_BYTES:,}바이트입니다."})
+                return
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": "JSON 형식이 올바르지 않습니다."})
+                return
+            try:
+                trunk_fee, pairs = parse_batch(request)
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            index = service.index
+            results = [index.quote(customer, product, trunk_fee) for customer, product in pairs]
+            self._send_json(200, {"results": results, "not_found": sum(result is None for result in results)})
+
+        def log_message(self, format, *args):
+            # 요청마다 로그를 찍으면 지연 시간이 늘어나므로 생략
+            pass
+
+    return QuoteHandler
+
+
+def make_server(service, host="127.0.0.1", port=8600):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="고래미 가격 조회 API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--refresh", type=int, default=DEFAULT_REFRESH_SECONDS, help="데이터 새로 읽기 주기 (초)")
+    parser.add_argument("--products", help="제품 마스터 CSV (세 CSV를 모두 주지 않으면 구글 시트에서 읽음)")
+    parser.add_argument("--clients", help="거래처 CSV")
+    parser.add_argument("--prices", help="확정 가격 CSV")
+    parser.add_argument("--credentials", default=SECRETS_PATH, help="gcp_service_account가 들어있는 secrets.toml 경로")
+    args = parser.parse_args(argv)
+
+    if args.products and args.clients and args.prices:
+        load_tables = lambda: load_csv_tables(args.products, args.clients, args.prices)
+    else:
+        load_tables = lambda: load_sheet_tables(args.credentials)
+
+    started = time.perf_counter()
+    service = QuoteService(load_tables, refresh_seconds=args.refresh)
+    service.start_refresher()
+    server = make_server(service, args.host, args.port)
+    print(f"견적 {len(service.index):,}건 로드 ({time.perf_counter() - started:.2f}s) · http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
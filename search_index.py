@@ -0,0 +1,85 @@
+# search_index.py
+# 거래처명/품목명 검색 인덱스: 부분 문자열, 초성(ㄱㄴㅁ), 중량/단위(1kg = 1000g) 검색 지원
+import re
+
+CHOSUNG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+_HANGUL_START, _HANGUL_END = 0xAC00, 0xD7A3
+_JAMO = set(CHOSUNG)
+_NOISE = re.compile(r"[\s()\[\]/_\-·,]+")
+_WEIGHT = re.compile(r"(\d+(?:\.\d+)?)\s*(kg|g|ml|l|ea|개)", re.IGNORECASE)
+# 같은 양을 같은 토큰으로 비교하기 위한 기준 단위
+_UNIT_SCALE = {'kg': ('g', 1000), 'g': ('g', 1), 'l': ('ml', 1000), 'ml': ('ml', 1), 'ea': ('ea', 1), '개': ('ea', 1)}
+
+
+def normalize(text):
+    return _NOISE.sub("", str(text)).lower()
+
+
+def to_chosung(text):
+    # 한글 음절은 초성으로, 나머지 문자는 그대로 둠
+    return "".join(
+        CHOSUNG[(ord(ch) - _HANGUL_START) // 588] if _HANGUL_START <= ord(ch) <= _HANGUL_END else ch
+        for ch in text
+    )
+
+
+def weight_tokens(text):
+    tokens = set()
+    for amount, unit in _WEIGHT.findall(str(text)):
+        base_unit, scale = _UNIT_SCALE[unit.lower()]
+        tokens.add(f"{float(amount) * scale:g}{base_unit}")
+    return tokens
+
+
+def _bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SearchIndex:
+    """이름 목록에 대한 사전 계산 인덱스. 2글자 단위 역색인으로 후보를 좁힌 뒤 부분 문자열로 확인"""
+
+    def __init__(self, names):
+        self.names = [str(name) for name in names]
+        self._fields = {
+            'text': [normalize(name) for name in self.names],
+            'chosung': [to_chosung(normalize(name)) for name in self.names],
+        }
+        self._weights = [weight_tokens(name) for name in self.names]
+        self._postings = {field: {} for field in self._fields}
+        for field, values in self._fields.items():
+            postings = self._postings[field]
+            for i, value in enumerate(values):
+                for gram in _bigrams(value):
+                    postings.setdefault(gram, set()).add(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _candidates(self, field, text):
+        grams = _bigrams(text)
+        if not grams:
+            return range(len(self.names))
+        postings = sorted((self._postings[field].get(gram, set()) for gram in grams), key=len)
+        return set.intersection(*postings) if postings[0] else set()
+
+    def search(self, query, limit=20):
+        """검색어와 일치하는 이름을 관련도 순으로 최대 limit개 반환"""
+        query = str(query or "").strip()
+        if not query:
+            return self.names[:limit]
+        query_weights = weight_tokens(query)
+        text = normalize(_WEIGHT.sub(" ", query))
+        # 자음이 하나라도 섞이면 초성 검색으로 처리 (예: 'ㄱㄴㅁㅅ', '가ㄴㅁ')
+        field = 'chosung' if any(ch in _JAMO for ch in text) else 'text'
+        if field == 'chosung':
+            text = to_chosung(text)
+
+        values = self._fields[field]
+        matches = []
+        for i in self._candidates(field, text):
+            position = values[i].find(text)
+            if position < 0 or not query_weights <= self._weights[i]:
+                continue
+            matches.append((position, len(self.names[i]), self.names[i]))
+        matches.sort()
+        return [name for _, _, name in matches[:limit]]